@@ -48,7 +48,7 @@ setup(
         'xmltodict',
     ],
     entry_points={
-        'console_scripts': ['tp = tp.cli:main'],
+        'console_scripts': ['tp = tp.client:run'],
         },
     license='MIT',
     keywords='tp,targetprocess,agile,kanban,project,management,cli',
@@ -3,12 +3,21 @@
 
 Classes:
     * ResponseContent: The response content of an API request.
+    * ReferenceObject: A read-only, interned nested reference object.
+    * Interner: Shares identical nested reference objects while decoding.
+    * EntitySchema: The field layout shared by compact entities of a query.
+    * CompactEntity: A compact, read-only Tp entity for bulk listings.
     * TpEntity: A generic Tp API entity class.
     * User: A Tp User entity.
     * General: A Tp General entity.
     * Assignable: A Tp Assignable entity.
     * GeneralFollower: A Tp GeneralFollower entity.
     * ApiError: Exception class for Tp API errors.
+    * TokenBucket: A client-side token-bucket rate limiter.
+    * RetryPolicy: Decides when and how long to wait before retrying.
+    * CircuitBreaker: Makes callers back off together from a failing server.
+    * Throttle: The rate limiter, retry policy and breaker for a subdomain.
+    * SingleFlight: Coalesces identical concurrent calls into one call.
     * TpApi: A class to interface with the Tp Api.
 
 Functions:
@@ -16,20 +25,39 @@ Functions:
 
 """
 
+from email.utils import mktime_tz, parsedate_tz
 import json
 import logging
-import re
+import random
+import sys
+import threading
+import time
 
 import requests
 import xmltodict
 
+from tp import timing
+from tp.transport import HttpTransport, mask_token
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 try:
     basestring
 except NameError:
     basestring = str
 
+_clock = getattr(time, 'monotonic', time.time)
+_intern = getattr(sys, 'intern', None) or intern  # noqa: F821
+
+#: HTTP methods that can safely be sent more than once.
+IDEMPOTENT_METHODS = ('delete', 'get', 'head', 'options', 'put')
 
-def fetch(api, entity, raw=False, **data):
+
+def fetch(api, entity, raw=False, compact=False, intern=False, extra=None,
+          **data):
     """Fetch *entity* from *api* using options *data*.
 
     Typical options include:
@@ -45,6 +73,13 @@ def fetch(api, entity, raw=False, **data):
     :param TpApi api: The API to use.
     :param TpEntity entity: The Tp entity to fetch.
     :param bool raw: Whether or not to return the raw response.
+    :param bool compact: Whether or not to return read-only CompactEntity
+        objects instead of *entity* objects. This uses much less memory for
+        large listings.
+    :param bool intern: Whether or not to share identical nested reference
+        objects, e.g. an Owner or EntityState, as read-only ReferenceObject
+        instances.
+    :param dict extra: Fields to add to each entity, e.g. {'Account': 'eu'}.
     :param dict data: The data to send with the request.
 
     :returns: The response.
@@ -64,8 +99,15 @@ def fetch(api, entity, raw=False, **data):
 
     if raw is True:
         return response
-    content = api.decode_content(response)
-    return [entity(item, api=api) for item in content['Items']]
+    content = api.decode_content(response, intern=intern)
+    items = content['Items']
+    if extra:
+        # The decoded content may be shared, so add the fields to copies.
+        items = [dict(item, **extra) for item in items]
+    if compact is True:
+        schemas = {}
+        return [CompactEntity.from_dict(item, schemas) for item in items]
+    return [entity(item, api=api) for item in items]
 
 
 class ResponseContent(dict):
@@ -91,6 +133,176 @@ class ResponseContent(dict):
             return default
 
 
+class ReferenceObject(dict):
+    """A read-only, interned nested reference object, e.g. an Owner.
+
+    Interned objects are shared by many entities, so they can't be changed.
+    Derived forms, e.g. formatters or compact copies, are cached on the object
+    so they're computed once per unique object.
+    """
+
+    __slots__ = ('formatters', 'compact')
+
+    def __init__(self, *args, **kwargs):
+        super(ReferenceObject, self).__init__(*args, **kwargs)
+        self.formatters = {}
+        self.compact = None
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('Interned reference objects are read-only.')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = _read_only
+    setdefault = update = _read_only
+
+
+class Interner(object):
+    """Shares identical nested reference objects while decoding a response.
+
+    Use :meth:`hook` as a json object_hook. Objects with a ResourceType and
+    an Id are keyed on their type, Id and fields, and each unique object is
+    only kept once.
+    """
+
+    def __init__(self):
+        """Create an empty table of interned objects."""
+        self.objects = {}
+
+    def hook(self, d):
+        """Intern *d* if it's a reference object."""
+        resource_type = d.get('ResourceType')
+        if resource_type is None or 'Id' not in d:
+            return d
+        key = (resource_type, d['Id'], tuple(d))
+        obj = self.objects.get(key)
+        if obj is None:
+            obj = self.objects[key] = ReferenceObject(d)
+        return obj
+
+
+class EntitySchema(object):
+    """The field layout shared by the compact entities of a query.
+
+    Every entity returned by a query has the same fields, as determined by the
+    query's include projection, so the field names are stored once per query
+    instead of once per entity.
+    """
+
+    __slots__ = ('fields', 'index')
+
+    def __init__(self, fields):
+        """Store the field names and their positions.
+
+        :param tuple fields: The field names.
+        """
+
+        self.fields = fields
+        self.index = dict((field, i) for i, field in enumerate(fields))
+
+
+class CompactEntity(Mapping):
+    """A compact, read-only Tp entity for bulk listings.
+
+    Values are stored in a tuple and field names in a shared EntitySchema.
+    Nested objects are compact entities too, so lookups like
+    entity['Owner']['FirstName'] work as they do for a TpEntity.
+    """
+
+    __slots__ = ('_schema', '_values', 'formatters')
+
+    def __init__(self, schema, values):
+        """Store the schema and values.
+
+        :param EntitySchema schema: The entity's field layout.
+        :param tuple values: The values in the schema's field order.
+        """
+
+        self._schema = schema
+        self._values = values
+
+        #: Cached formatters, only used for shared reference objects.
+        self.formatters = None
+
+    @classmethod
+    def from_dict(cls, d, schemas):
+        """Create a compact entity from a decoded JSON object.
+
+        :param dict d: The decoded object.
+        :param dict schemas: A mapping of field name tuples to EntitySchema
+            objects that is shared by all the entities of one query.
+        """
+
+        if isinstance(d, ReferenceObject):
+            if d.compact is None:
+                d.compact = cls._from_dict(d, schemas)
+                d.compact.formatters = d.formatters
+            return d.compact
+        return cls._from_dict(d, schemas)
+
+    @classmethod
+    def _from_dict(cls, d, schemas):
+        fields = tuple(d)
+        schema = schemas.get(fields)
+        if schema is None:
+            schema = schemas[fields] = EntitySchema(fields)
+        return cls(schema, tuple(cls._compact_value(d[f], schemas)
+                                 for f in fields))
+
+    @classmethod
+    def _compact_value(cls, value, schemas):
+        """Convert nested objects and lists to compact forms.
+
+        Short strings, e.g. state and type names, are interned so repeated
+        values share one string object.
+        """
+
+        if isinstance(value, dict):
+            return cls.from_dict(value, schemas)
+        elif isinstance(value, list):
+            return tuple(cls._compact_value(v, schemas) for v in value)
+        elif type(value) is str and len(value) <= 32:
+            return _intern(value)
+        return value
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._schema.index[key]]
+        except KeyError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._schema.fields)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, self.to_dict())
+
+    def to_dict(self):
+        """Get the entity's data as nested dicts and lists."""
+        return dict((k, self._expand_value(v)) for k, v in
+                    zip(self._schema.fields, self._values))
+
+    @classmethod
+    def _expand_value(cls, value):
+        """Convert compact nested objects and tuples back to dicts/lists."""
+        if isinstance(value, CompactEntity):
+            return value.to_dict()
+        elif isinstance(value, tuple):
+            return [cls._expand_value(v) for v in value]
+        return value
+
+    def to_entity(self, entity=None, api=None):
+        """Convert this object to a full, mutable Tp entity.
+
+        :param entity: The TpEntity subclass to create. Defaults to TpEntity.
+        :param TpApi api: The API to store on the new entity.
+        """
+
+        entity = TpEntity if entity is None else entity
+        return entity(self.to_dict(), api=api)
+
+
 class TpEntity(dict):
     """A generic Tp API entity class."""
 
@@ -241,14 +453,270 @@ class ApiError(Exception):
         super(Exception, self).__init__(*args)
 
 
+class TokenBucket(object):
+    """A thread-safe, client-side token-bucket rate limiter."""
+
+    def __init__(self, rate, capacity=None):
+        """Create a full bucket.
+
+        :param float rate: The number of tokens added per second. A rate of
+            zero or less disables rate limiting.
+        :param float capacity: The maximum number of tokens, i.e. the largest
+            allowed burst of requests. Defaults to *rate*.
+        """
+
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(rate, 1))
+        self.tokens = self.capacity
+        self._updated = _clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take *tokens* from the bucket, waiting until they are available."""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = _clock()
+                elapsed = now - self._updated
+                self.tokens = min(self.capacity,
+                                  self.tokens + elapsed * self.rate)
+                self._updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryPolicy(object):
+    """Decides when a request is retried and how long to wait first.
+
+    Only idempotent methods are retried. Delays grow exponentially with "full
+    jitter" unless the server sent a Retry-After header.
+    """
+
+    def __init__(self, retries=3, backoff=0.5, max_backoff=30.0,
+                 statuses=(429, 503), methods=IDEMPOTENT_METHODS):
+        """Store the policy settings.
+
+        :param int retries: The maximum number of retries per request.
+        :param float backoff: The base delay in seconds.
+        :param float max_backoff: The longest delay in seconds.
+        :param tuple statuses: The HTTP status codes that trigger a retry.
+        :param tuple methods: The (lowercase) HTTP methods that can be
+            retried.
+        """
+
+        self.retries = int(retries)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.statuses = tuple(statuses)
+        self.methods = tuple(methods)
+
+    def should_retry(self, method, attempt):
+        """Whether or not to retry *method* after *attempt* failed tries."""
+        return method.lower() in self.methods and attempt < self.retries
+
+    def get_delay(self, attempt, response=None):
+        """Get the number of seconds to wait before the next attempt.
+
+        :param int attempt: The number of failed attempts so far, minus one.
+        :param requests.Response response: The failed response, if any.
+        """
+
+        retry_after = self.get_retry_after(response)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        ceiling = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def get_retry_after(self, response):
+        """Get the Retry-After header from *response* in seconds or None."""
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        date = parsedate_tz(value)
+        if date is None:
+            return None
+        return max(0.0, mktime_tz(date) - time.time())
+
+
+class CircuitBreaker(object):
+    """Makes every caller back off together from a struggling server.
+
+    After *threshold* consecutive failures the circuit opens and requests fail
+    immediately for *timeout* seconds. A retry delay chosen by any caller is
+    also shared, so parallel callers pause together instead of taking turns.
+    """
+
+    def __init__(self, threshold=5, timeout=30.0):
+        """Create a closed circuit.
+
+        :param int threshold: Consecutive failures before the circuit opens.
+            Zero or less disables the breaker.
+        :param float timeout: Seconds the circuit stays open.
+        """
+
+        self.threshold = int(threshold)
+        self.timeout = float(timeout)
+        self.failures = 0
+        self.opened_until = 0.0
+        self.resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Wait out any shared pause and fail fast if the circuit is open.
+
+        :raises ApiError: if the circuit is open.
+        """
+
+        with self._lock:
+            now = _clock()
+            if now < self.opened_until:
+                raise ApiError('CircuitOpen',
+                               'Too many failed requests. Try again in '
+                               '{0:.0f} seconds.'.format(
+                                   self.opened_until - now))
+            wait = self.resume_at - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, delay):
+        """Make all callers wait *delay* seconds before their next request."""
+        with self._lock:
+            self.resume_at = max(self.resume_at, _clock() + delay)
+
+    def record_success(self):
+        """Close the circuit."""
+        with self._lock:
+            self.failures = 0
+
+    def record_failure(self):
+        """Count a failure and open the circuit if the threshold is reached."""
+        with self._lock:
+            self.failures += 1
+            if self.threshold > 0 and self.failures >= self.threshold:
+                self.opened_until = _clock() + self.timeout
+                self.failures = 0
+
+
+class Throttle(object):
+    """The rate limiter, retry policy and circuit breaker for a subdomain.
+
+    Use :meth:`for_subdomain` so that every TpApi object talking to the same
+    subdomain shares one throttle.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, rate_limit=10, rate_burst=None, retries=3,
+                 backoff=0.5, max_backoff=30.0, breaker_threshold=5,
+                 breaker_timeout=30.0):
+        """Create the throttle's components.
+
+        :param float rate_limit: Requests per second. Zero disables limiting.
+        :param float rate_burst: The largest allowed burst of requests.
+        :param int retries: The maximum number of retries per request.
+        :param float backoff: The base retry delay in seconds.
+        :param float max_backoff: The longest retry delay in seconds.
+        :param int breaker_threshold: Consecutive failures before the circuit
+            breaker opens.
+        :param float breaker_timeout: Seconds the circuit breaker stays open.
+        """
+
+        self.limiter = TokenBucket(rate_limit, rate_burst)
+        self.retry_policy = RetryPolicy(retries, backoff, max_backoff)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_timeout)
+
+    @classmethod
+    def for_subdomain(cls, subdomain, **settings):
+        """Get the shared throttle for *subdomain*.
+
+        *settings* are only used when the throttle is first created.
+        """
+
+        with cls._instances_lock:
+            if subdomain not in cls._instances:
+                cls._instances[subdomain] = cls(**settings)
+            return cls._instances[subdomain]
+
+    def before_request(self):
+        """Wait until a request is allowed to be sent."""
+        self.breaker.check()
+        self.limiter.acquire()
+
+    def backoff(self, attempt, response=None):
+        """Wait before retrying and make other callers wait too."""
+        delay = self.retry_policy.get_delay(attempt, response)
+        self.breaker.pause(delay)
+        self.breaker.check()
+
+
+class SingleFlight(object):
+    """Coalesces identical concurrent calls into a single call.
+
+    While a call for a key is in flight, other callers asking for the same key
+    wait for it to finish and receive its result (or exception).
+    """
+
+    def __init__(self):
+        """Create an empty registry of in-flight calls."""
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        """Call *func* unless an identical call for *key* is in flight.
+
+        :param key: A hashable key identifying the call.
+        :param func: The callable to run.
+        :returns: The result of the (possibly shared) call.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'event': threading.Event()}
+
+        if not leader:
+            call['event'].wait()
+            if 'error' in call:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = func(*args, **kwargs)
+        except Exception as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['event'].set()
+        return call['result']
+
+
 class TpApi(object):
     """An interface to the Tp Api."""
 
     uri = 'https://{subdomain}.tpondemand.com/api/v1/'
     response_format = 'json'
 
+    #: Identical concurrent GET requests share one HTTP call.
+    _flights = SingleFlight()
+    _decode_lock = threading.Lock()
+
     def __init__(self, subdomain, token=None, username=None, password=None,
-                 user_id=None):
+                 user_id=None, throttle=None, uri=None, transport=None):
         """Construct the base URI.
 
         :param str subdomain: The Targetprocess subdomain to use.
@@ -256,11 +724,19 @@ class TpApi(object):
         :param str username: A Targetprocess username (login).
         :param str password: A Targetprocess password.
         :param str user_id: A Targetprocess user's id.
+        :param Throttle throttle: The rate limiter and retry policy to use.
+            Defaults to the shared throttle for *subdomain*.
+        :param str uri: A base URI template to use instead of the class's
+            *uri*, e.g. for an on-site installation or a test server.
+        :param transport: The transport used to send requests, e.g. a
+            tp.transport.ReplayTransport. Defaults to an HttpTransport.
         """
 
         self._logger = logging.getLogger(__name__)
 
         self.subdomain = subdomain
+        if uri:
+            self.uri = uri
         self.base_uri = self.uri.format(subdomain=self.subdomain)
 
         if not any((token, username and password)):
@@ -271,6 +747,8 @@ class TpApi(object):
         self.username = username
         self.password = password
         self.user_id = user_id
+        self.throttle = throttle or Throttle.for_subdomain(subdomain)
+        self.transport = transport or HttpTransport()
 
     def get_context(self):
         """Get the current context object.
@@ -343,40 +821,111 @@ class TpApi(object):
             request_kws['headers']['Content-Type'] = 'application/{0}'.format(
                 self.response_format)
 
-        response = requests.request(method, url, **request_kws)
+        with timing.span('api.request', method=method,
+                         resource=resource) as span:
+            if method == 'get':
+                key = self.get_request_key(method, resource, data)
+                response = self._flights.do(key, self.transport.send,
+                                            method, url, **request_kws)
+            else:
+                response = self.transport.send(method, url, **request_kws)
+            if span:
+                span.set(status=response.status_code,
+                         bytes=len(response.content))
         return response
 
+    def get_request_key(self, method, resource, data=None):
+        """Get a key identifying a request's method, resource and params.
+
+        :param str method: HTTP method to use, e.g. 'get' or 'post'.
+        :param str resource: Relative resource URI for the request.
+        :param dict data: The data to send with the request.
+        :rtype: tuple
+        """
+
+        params = json.dumps(data, sort_keys=True, default=str)
+        user = self.token if self.token is not None else self.username
+        return (method.lower(), self.base_uri, user, resource, params)
+
     def request_and_raise_error(self, *args, **kwargs):
-        """Send a request and raise an ApiError if it fails."""
+        """Send a request and raise an ApiError if it fails.
 
-        try:
-            response = self.request(*args, **kwargs)
-        except requests.exceptions.ConnectionError as e:
-            self.log_exception(e)
-            raise ApiError('ConnectionError',
-                           'Failed to establish a new connection.')
+        Requests are rate limited by the API's throttle. Idempotent requests
+        that fail to connect or are throttled by Tp (e.g. 429 or 503) are
+        retried with exponential backoff.
+        """
+
+        method = args[0] if args else kwargs['method']
+        throttle = self.throttle
+        policy = throttle.retry_policy
+        attempt = 0
+        while True:
+            throttle.before_request()
+            try:
+                response = self.request(*args, **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                self.log_exception(e)
+                throttle.breaker.record_failure()
+                if not policy.should_retry(method, attempt):
+                    raise ApiError('ConnectionError',
+                                   'Failed to establish a new connection.')
+                throttle.backoff(attempt)
+                attempt += 1
+                continue
+
+            if response.status_code not in policy.statuses:
+                throttle.breaker.record_success()
+                break
+
+            throttle.breaker.record_failure()
+            if not policy.should_retry(method, attempt):
+                break
+            self._logger.info('Retrying %s request after status %s.',
+                              method.upper(), response.status_code)
+            throttle.backoff(attempt, response)
+            attempt += 1
 
         if response.status_code < 200 or response.status_code >= 300:
             self.raise_exception(response)
 
         return response
 
-    def decode_content(self, response):
-        """Decode the JSON content for *response*."""
+    def decode_content(self, response, intern=False):
+        """Decode the JSON content for *response*.
 
-        try:
-            return ResponseContent(response.json())
-        except (json.decoder.JSONDecodeError, ValueError) as e:
-            self.log_exception(e)
+        The decoded content is stored on the response, so callers sharing a
+        coalesced response also share one decoded result.
+
+        :param requests.Response response: The response to decode.
+        :param bool intern: Whether or not to share identical nested
+            reference objects as read-only ReferenceObject instances.
+        """
+
+        attr = '_tp_interned' if intern is True else '_tp_content'
+        with self._decode_lock:
+            content = getattr(response, attr, None)
+            if content is not None:
+                return content
+            with timing.span('api.decode') as span:
+                hook = Interner().hook if intern is True else None
+                try:
+                    content = ResponseContent(response.json(
+                        object_hook=hook))
+                except (json.decoder.JSONDecodeError, ValueError) as e:
+                    self.log_exception(e)
+                    return None
+                if span:
+                    span.set(items=len(content.get('Items', ())))
+            setattr(response, attr, content)
+            return content
 
     def log_exception(self, exception):
         """Log an exception."""
 
         # Hide the user's token from the logged message.
-        message = re.sub('(?<=token=)[a-zA-Z0-9\%]+(?=[& ])', '*****',
-                         str(exception))
+        message = mask_token(str(exception))
 
-        self._logger.warning('Exception raised: {0}'.format(message))
+        self._logger.warning('Exception raised: %s', message)
 
     def raise_exception(self, response):
         """Raise an ApiError with the proper status code and message."""
@@ -1,19 +1,71 @@
 # -*- coding: utf-8 -*-
 """The tp command-line app class."""
 
+import heapq
+from itertools import chain, islice
 import logging
+import os
 from os.path import expanduser
 import re
+import sys
+import threading
 
 import click
 
-from tp import api
+from tp import api, cache, log, timing, transport
 from tp.config import TpConfig
+from tp.formatter import sort_key
 from tp.parser import FilterParser
 
 
 class TpApp(object):
 
+    #: Whether or not shared() reuses app objects. Long-running processes,
+    #: e.g. the tp daemon, turn this on to keep apps warm between commands.
+    reuse = False
+
+    #: A tp.cache.ResponseCache shared by every app's API, if any.
+    response_cache = None
+
+    _shared = {}
+
+    #: The options used by the last list() call, after applying the
+    #: template's defaults, e.g. to sort its results locally.
+    list_options = None
+
+    #: The fields `tp show` includes in its request. Prefetching uses the
+    #: same fields, so the requests match.
+    SHOW_INCLUDE = (
+        'Comments[CreateDate,Description,Id,Owner,ParentId]',
+        'CreateDate',
+        'Description',
+        'EntityState[Name]',
+        'EntityType[Name]',
+        'Id',
+        'LastStateChangeDate',
+        'Name',
+        'Owner[Firstname,LastName]',
+    )
+
+    @classmethod
+    def shared(cls, cmd, **configs):
+        """Get an app object for *cmd*, reusing one if reuse is on.
+
+        :param str cmd: The calling tp command, e.g. 'ls'.
+        :param configs: The app's configuration. See __init__().
+        """
+
+        if cls.reuse is False:
+            return cls(cmd, **configs)
+        key = (cmd, tuple(sorted(configs.items())))
+        app = cls._shared.get(key)
+        if app is None:
+            app = cls._shared[key] = cls(cmd, **configs)
+        else:
+            app.config.template = cmd
+        return app
+
+    @timing.timed('app.init')
     def __init__(self, cmd, **configs):
         """Set up the tp app object.
 
@@ -23,58 +75,191 @@ class TpApp(object):
         :param str username: The username to use.
         :param str password: The password to use.
         :param str user_id: The user's ID.
+        :param str uri: The API's base URI template, e.g.
+            'https://{subdomain}.tpondemand.com/api/v1/'.
         """
 
-        # Read the default, system, and user config files.
-        self.config = TpConfig(template=cmd)
+        with timing.span('app.config'):
+            # Read the default, system, and user config files.
+            self.config = TpConfig(template=cmd)
 
         # Get the app's root logger.
-        log_file = expanduser(self.config.get('app', 'log_file'))
-        log_format = self.config.get('app', 'log_format')
-        log_date_format = self.config.get('app', 'log_date_format',
-                                          fallback=None)
-        log_level = self.config.get('app', 'log_level').upper()
-        self._logger = logging.getLogger('tp')
-        self._formatter = logging.Formatter(fmt=log_format,
-                                            datefmt=log_date_format)
-        self._handler = logging.FileHandler(log_file)
-        self._handler.setFormatter(self._formatter)
-        self._logger.addHandler(self._handler)
-        self._logger.setLevel(getattr(logging, log_level))
-
-        # Get the authentication details.
-        subdomain = self.config.get('auth', 'subdomain', vars=configs)
-        token = self.config.get('auth', 'token', vars=configs, fallback=None)
-        username = self.config.get('auth', 'username', vars=configs,
-                                   fallback=None)
-        password = self.config.get('auth', 'password', vars=configs,
-                                   fallback=None)
-        user_id = self.config.get('auth', 'user_id', vars=configs,
-                                  fallback=None)
-
-        # Prompt for any missing authentication details.
-        if subdomain is None:
-            subdomain = click.prompt('What is the TargetProcess subdomain your'
-                                     ' organization uses?', prompt_suffix=' ')
-        if username is None:
-            username = click.prompt('What is your TargetProcess user name?',
-                                    prompt_suffix=' ')
-        if password is None and token is None:
-            password = click.prompt('What is your TargetProcess password?',
-                                    hide_input=True, prompt_suffix=' ')
+        with timing.span('app.logging'):
+            log_file = expanduser(self.config.get('app', 'log_file'))
+            log_format = self.config.get('app', 'log_format')
+            log_date_format = self.config.get('app', 'log_date_format',
+                                              fallback=None)
+            log_level = self.config.get('app', 'log_level')
+            log.setup(log_file, log_format, log_date_format, log_level)
+            self._logger = logging.getLogger('tp')
 
         # Create a TP API interface.
-        self.api = api.TpApi(subdomain, token=token, username=username,
-                             password=password, user_id=user_id)
+        self._configs = configs
+        self._apis = {}
+        self.api = self.get_api()
 
         # Store the calling command's name.
         self.cmd = cmd
 
+    def get_api(self, account=None):
+        """Get the TP API interface for *account*.
+
+        Each account is configured in an [auth.<account>] section with the
+        same options as [auth]. The interfaces are created once and reused.
+
+        :param str account: The account's name, or None or 'default' for
+            the account in the [auth] section.
+        :raises configparser.NoSectionError: If the account isn't
+            configured.
+        """
+
+        if account == 'default':
+            account = None
+        api_ = self._apis.get(account)
+        if api_ is not None:
+            return api_
+
+        # Get the authentication details. Options passed to the app only
+        # apply to the default account.
+        with timing.span('app.auth'):
+            section = self.config.get_auth_section(account)
+            configs = self._configs if account is None else None
+            subdomain = self.config.get(section, 'subdomain', vars=configs)
+            token = self.config.get(section, 'token', vars=configs,
+                                    fallback=None)
+            username = self.config.get(section, 'username', vars=configs,
+                                       fallback=None)
+            password = self.config.get(section, 'password', vars=configs,
+                                       fallback=None)
+            user_id = self.config.get(section, 'user_id', vars=configs,
+                                      fallback=None)
+            uri = self.config.get(section, 'uri', vars=configs,
+                                  fallback=None)
+
+            # Prompt for any missing authentication details.
+            if subdomain is None:
+                subdomain = click.prompt('What is the TargetProcess subdomain '
+                                         'your organization uses?',
+                                         prompt_suffix=' ')
+            if username is None:
+                username = click.prompt('What is your TargetProcess user '
+                                        'name?', prompt_suffix=' ')
+            if password is None and token is None:
+                password = click.prompt('What is your TargetProcess password?',
+                                        hide_input=True, prompt_suffix=' ')
+
+        throttle = api.Throttle.for_subdomain(
+            subdomain, **self.get_throttle_settings(subdomain))
+        api_ = self._apis[account] = api.TpApi(
+            subdomain, token=token, username=username, password=password,
+            user_id=user_id, throttle=throttle, uri=uri,
+            transport=self.get_transport())
+        return api_
+
+    def get_transport(self):
+        """Get the API transport, which may record or replay traffic."""
+        replay = self.config.get('app', 'replay', fallback=None)
+        if replay:
+            latency = self.config.getboolean('app', 'replay_latency',
+                                             fallback=False)
+            return transport.ReplayTransport(expanduser(replay),
+                                             latency=latency)
+        record = self.config.get('app', 'record', fallback=None)
+        if record:
+            return transport.RecordingTransport(expanduser(record))
+        if self.response_cache is not None:
+            return cache.CachingTransport(self.response_cache)
+        disk_cache = self.get_disk_cache()
+        if disk_cache is not None:
+            # Serve any responses prefetched by another tp process.
+            return cache.CachingTransport(disk_cache, write=False)
+        return transport.HttpTransport()
+
+    def get_disk_cache(self):
+        """Get the cache for prefetched responses, or None if it's off."""
+        ttl = self.config.getfloat('app', 'prefetch_ttl', fallback=0)
+        if ttl <= 0:
+            return None
+        directory = expanduser(self.config.get('app', 'cache_dir'))
+        return cache.DiskResponseCache(directory, ttl)
+
+    def prefetch(self, ids):
+        """Fetch the `tp show` responses for *ids* in the background.
+
+        The responses are stored in the daemon's response cache when running
+        in the daemon, or else in the disk cache by a forked process, so a
+        following `tp show` doesn't wait on the network.
+
+        :param list ids: The IDs of the entities to prefetch.
+        """
+
+        if not ids:
+            return
+        if self.response_cache is not None:
+            thread = threading.Thread(target=self._prefetch, args=(ids, ))
+            thread.daemon = True
+            thread.start()
+            return
+
+        disk_cache = self.get_disk_cache()
+        if disk_cache is None or not hasattr(os, 'fork'):
+            return
+
+        # Fork twice, so the prefetching process isn't left as a zombie of
+        # a long-running parent, e.g. `tp shell`.
+        pid = os.fork()
+        if pid > 0:
+            os.waitpid(pid, 0)
+            return
+        try:
+            if os.fork() > 0:
+                os._exit(0)
+            # Don't hold on to the terminal or to any pipe, e.g. a pager.
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            # Use a new session instead of the parent's connections.
+            self.api.transport = cache.CachingTransport(
+                disk_cache, transport.HttpTransport(), read=False)
+            disk_cache.prune()
+            self._prefetch(ids)
+        finally:
+            log.shutdown()
+            os._exit(0)
+
+    def _prefetch(self, ids):
+        """Fetch the `tp show` responses for *ids*."""
+        for id in ids:
+            try:
+                self.show(id, raw=True, include=self.SHOW_INCLUDE)
+            except Exception as e:
+                self._logger.debug('Unable to prefetch #%s: %s', id, e)
+
+    def get_throttle_settings(self, subdomain):
+        """Get the rate limit and retry settings for *subdomain*.
+
+        Options in the [api.<subdomain>] section override those in [api].
+        """
+
+        opts = (('rate_limit', float), ('rate_burst', float),
+                ('retries', int), ('backoff', float), ('max_backoff', float),
+                ('breaker_threshold', int), ('breaker_timeout', float))
+        section = 'api.{0}'.format(subdomain)
+        settings = {}
+        for option, cast in opts:
+            value = self.config.get(section, option,
+                                    fallback=self.config.get('api', option,
+                                                             fallback=None))
+            if value is not None:
+                settings[option] = cast(value)
+        return settings
+
     def get_url(self, id):
         """Get the URL for entity *id*."""
         entity = api.General(api=self.api, Id=id)
         return entity.get_url()
 
+    @timing.timed('app.show')
     def show(self, id, raw=False, **options):
         """Get TP entity by ID.
 
@@ -92,7 +277,7 @@ class TpApp(object):
         if len(assignables) == 0:
             click.secho("Uh oh! That ID doesn't seem to match anything.",
                         fg='red')
-            exit(1)
+            sys.exit(1)
         elif len(assignables) > 1:
             click.secho('Hmm. That ID matches more than one result. '
                         "Let's use the first one.", fg='yellow')
@@ -124,7 +309,7 @@ class TpApp(object):
         if len(values['template']) > 1:
             click.secho('Error: More than one template found in the filter '
                         'query.', fg='red')
-            exit(1)
+            sys.exit(1)
         elif values['template']:
             values['template'] = values['template'].pop()
         else:
@@ -134,24 +319,116 @@ class TpApp(object):
         if len(values['number']) > 1:
             click.secho('Error: More than one integer found in filter '
                         'query.', fg='red')
-            exit(1)
+            sys.exit(1)
         elif values['number']:
             values['number'] = values['number'].pop()
 
         return values
 
-    def list(self, filters, raw=False, **options):
+    @timing.timed('app.list')
+    def list(self, filters, raw=False, compact=False, intern=False,
+             **options):
         """Get TP entities based on a filter.
 
         :param list filters: A list of filters to apply to the search.
         :param bool raw: Whether or not to return the raw JSON response.
+        :param bool compact: Whether or not to return read-only
+            tp.api.CompactEntity objects, which use less memory.
+        :param bool intern: Whether or not to share identical nested
+            reference objects, e.g. owners and states, between entities.
+        :param options: The list options. See plan_list().
+
+        :returns: A list of matching entities.
+        :rtype: tp.api.Assignable
+        """
+
+        data = self.plan_list(filters, **options)
+        assignables = api.fetch(self.api, api.Assignable, raw=raw,
+                                compact=compact, intern=intern, **data)
+
+        if raw is True:
+            return assignables.json()
+
+        return assignables
+
+    @timing.timed('app.list_accounts')
+    def list_accounts(self, accounts, filters, compact=False, intern=False,
+                      **options):
+        """Get TP entities based on a filter from several accounts at once.
+
+        The accounts are queried concurrently. Each account's results are
+        already sorted, so they're merged on the sort field, and each entity
+        gets an Account field with the name of its account.
+
+        :param list accounts: The names of the accounts. See get_api().
+        :param list filters: A list of filters to apply to the search.
+        :param bool compact: Whether or not to return read-only
+            tp.api.CompactEntity objects.
+        :param bool intern: Whether or not to share identical nested
+            reference objects between entities.
+        :param options: The list options. See plan_list().
+
+        :returns: The matching entities across all of the accounts.
+        :rtype: list
+        """
+
+        data = self.plan_list(filters, **options)
+        options = self.list_options
+
+        # The offset applies to the merged results, so each account needs
+        # to return the entities before it too.
+        number, offset = options['number'], options['offset'] or 0
+        data.pop('skip', None)
+        if number:
+            data['take'] = number + offset
+
+        # Get the APIs first, as they may prompt for missing details.
+        apis = [(name, self.get_api(name)) for name in accounts]
+        results = [None] * len(apis)
+        errors = []
+
+        def fetch(index, name, api_):
+            try:
+                results[index] = api.fetch(api_, api.Assignable,
+                                           compact=compact, intern=intern,
+                                           extra={'Account': name}, **data)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=fetch, args=(index, name, api_))
+                   for index, (name, api_) in enumerate(apis)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+        if options['sort']:
+            merged = heapq.merge(*results, key=sort_key(options['sort']),
+                                 reverse=bool(options['reverse']))
+        else:
+            merged = chain(*results)
+        return list(islice(merged, offset, offset + number if number else
+                           None))
+
+    def plan_list(self, filters, since=None, **options):
+        """Get the TP API options for listing entities based on a filter.
+
+        This also sets the config's template to the one in the filter.
+
+        :param list filters: A list of filters to apply to the search.
         :param int number: The number of results to return.
         :param int offset: The number to offset the results by.
         :param str sort: The field to sort the results by.
         :param bool reverse: Whether or not to reverse the sort order.
+        :param list include: Attributes to get on top of the template's
+            fields, e.g. ['ModifyDate'].
+        :param str since: Only get entities modified at or after this date,
+            e.g. '2016-01-01 12:00:00'.
 
-        :returns: A list of matching entities.
-        :rtype: tp.api.Assignable
+        :returns: The TP API options for use in an API request.
+        :rtype: dict
         """
 
         # Parse the filters.
@@ -186,6 +463,9 @@ class TpApp(object):
             options['where'] = '{0} and {1}'.format(_where, options['where'])
         else:
             options['where'] = _where
+        if since is not None:
+            options['where'] = "{0} and (ModifyDate gte '{1}')".format(
+                options['where'], since)
 
         # Get default options if none were provided.
         opts = (('number', 'int'), ('offset', 'int'), ('sort', 'str'),
@@ -194,20 +474,42 @@ class TpApp(object):
             if options.get(option) is None:
                 options[option] = self.config.get_from_template(option,
                                                                 cast=cast)
+        self.list_options = dict(options)
 
         # Generate fields to include from fields that will be displayed.
         fields = self.config.get_from_template('fields')
-        options['include'] = self._fields_to_attrs(fields)
+        options['include'] = (self._fields_to_attrs(fields) +
+                              list(options.get('include') or ()))
+        # Include the sort field, so results can be sorted again locally.
+        if options['sort']:
+            options['include'].append(options['sort'])
 
         # Convert the tp options to TP API options.
-        data = self._options_to_api_data(**options)
+        return self._options_to_api_data(**options)
 
-        assignables = api.fetch(self.api, api.Assignable, raw=raw, **data)
+    def get_changed_ids(self, ids, since, batch_size=200):
+        """Get the IDs out of *ids* of entities modified since *since*.
 
-        if raw is True:
-            return assignables.json()
+        Unlike list(), this ignores any filters, so it finds entities that
+        changed in a way that no longer matches a filter.
 
-        return assignables
+        :param ids: The IDs of the entities to check.
+        :param str since: The date to check from, e.g. '2016-01-01 12:00:00'.
+        :param int batch_size: The largest number of IDs in one request.
+        :returns: The IDs of the modified entities.
+        :rtype: set
+        """
+
+        ids = sorted(ids)
+        changed = set()
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            where = "(Id in ({0})) and (ModifyDate gte '{1}')".format(
+                ','.join(str(i) for i in batch), since)
+            items = api.fetch(self.api, api.Assignable, compact=True,
+                              where=where, include='[Id]', take=len(batch))
+            changed.update(item['Id'] for item in items)
+        return changed
 
     def _fields_to_attrs(self, fields):
         """Format *fields* as a list of attributes.
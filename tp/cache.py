@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""Response caches for tp.
+
+Classes:
+    * ResponseCache: A thread-safe, in-memory cache of API responses with a
+      TTL.
+    * DiskResponseCache: A cache of API responses with a TTL that's shared
+      between tp processes.
+    * CachingTransport: A transport that serves GET requests from a cache.
+
+"""
+
+from collections import OrderedDict
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from tp.transport import (HttpTransport, dump_response, get_request_key,
+                          load_response)
+
+_clock = getattr(time, 'monotonic', time.time)
+
+
+class ResponseCache(object):
+    """A thread-safe cache of API responses that expire after *ttl* seconds.
+
+    The least recently used responses are dropped once the cache holds
+    *max_entries* responses.
+    """
+
+    def __init__(self, ttl=60.0, max_entries=1000):
+        """Create an empty cache.
+
+        :param float ttl: The number of seconds a response stays fresh.
+        :param int max_entries: The largest number of responses to keep.
+        """
+
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Get the fresh response stored for *key* or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored, response = entry
+            if _clock() - stored > self.ttl:
+                del self._entries[key]
+                return None
+            # Mark the entry as recently used.
+            del self._entries[key]
+            self._entries[key] = entry
+            return response
+
+    def set(self, key, response):
+        """Store *response* for *key*."""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (_clock(), response)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every stored response."""
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskResponseCache(object):
+    """A cache of API responses in a directory, one JSON file per response.
+
+    Files are replaced atomically, so several tp processes can use the cache
+    at once. Responses expire *ttl* seconds after they're stored.
+    """
+
+    def __init__(self, directory, ttl=60.0):
+        """Store the cache's location.
+
+        :param str directory: The directory to keep responses in. It's
+            created when the first response is stored.
+        :param float ttl: The number of seconds a response stays fresh.
+        """
+
+        self.directory = directory
+        self.ttl = float(ttl)
+
+    def _get_filename(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest + '.json')
+
+    def _get_filenames(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return [os.path.join(self.directory, name) for name in names
+                if name.endswith('.json')]
+
+    def __len__(self):
+        return len(self._get_filenames())
+
+    def get(self, key):
+        """Get the fresh response stored for *key* or None."""
+        filename = self._get_filename(key)
+        try:
+            with open(filename) as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if time.time() - entry['stored'] > self.ttl:
+            self._remove(filename)
+            return None
+        return load_response(entry['response'])
+
+    def set(self, key, response):
+        """Store *response* for *key*."""
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, 0o700)
+        entry = {'stored': time.time(), 'response': dump_response(response)}
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(entry, f)
+        os.rename(tmp, self._get_filename(key))
+
+    def clear(self):
+        """Remove every stored response."""
+        for filename in self._get_filenames():
+            self._remove(filename)
+
+    def prune(self):
+        """Remove the responses that have expired."""
+        now = time.time()
+        for filename in self._get_filenames():
+            try:
+                if now - os.path.getmtime(filename) > self.ttl:
+                    self._remove(filename)
+            except OSError:
+                pass
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+
+class CachingTransport(object):
+    """A transport that serves repeated GET requests from a ResponseCache.
+
+    Successful GET responses are stored. Any other request, e.g. a save or a
+    delete, clears the cache, because it may change what a GET returns.
+    """
+
+    def __init__(self, cache, transport=None, read=True, write=True):
+        """Store the cache and the transport used on a cache miss.
+
+        :param cache: The ResponseCache or DiskResponseCache to use.
+        :param transport: The transport used to send requests. Defaults to an
+            HttpTransport.
+        :param bool read: Whether or not to serve responses from the cache.
+        :param bool write: Whether or not to store responses in the cache.
+        """
+
+        self.cache = cache
+        self.transport = transport or HttpTransport()
+        self.read = read
+        self.write = write
+
+    def send(self, method, url, **kwargs):
+        """Get a response from the cache or send the request."""
+        if method.lower() != 'get':
+            self.cache.clear()
+            return self.transport.send(method, url, **kwargs)
+
+        key = get_request_key(method, url, kwargs.get('params'),
+                              kwargs.get('json'))
+        response = self.cache.get(key) if self.read else None
+        if response is None:
+            response = self.transport.send(method, url, **kwargs)
+            if self.write and 200 <= response.status_code < 300:
+                self.cache.set(key, response)
+        return response
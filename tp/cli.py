@@ -4,10 +4,13 @@
 import imp
 import logging
 import os
+import sys
+import time
 
 import click
 
 from ._version import __version__ as VERSION
+from tp import timing
 
 
 class TpGroup(click.Group):
@@ -49,14 +52,14 @@ class TpGroup(click.Group):
             function named 'main'.
         """
 
-        self._logger.debug("Loading module '{0}'.".format(filename))
+        self._logger.debug("Loading module '%s'.", filename)
         module = imp.load_source(name, filename)
         try:
             return getattr(module, function)
         except AttributeError:
-            self._logger.error("Command '{0}' does not have a function named "
-                               "'{1}'. Unable to register command in file "
-                               "'{2}'.".format(name, function, filename))
+            self._logger.error("Command '%s' does not have a function named "
+                               "'%s'. Unable to register command in file "
+                               "'%s'.", name, function, filename)
             return None
 
     def get_command_files(self):
@@ -67,13 +70,13 @@ class TpGroup(click.Group):
 
         cmds = []
         for _dir in self.cmd_dirs:
-            self._logger.debug("Looking for commands in '{0}'.".format(_dir))
+            self._logger.debug("Looking for commands in '%s'.", _dir)
             try:
                 for fname in os.listdir(_dir):
                     if (fname.endswith('.py') and
                             fname.startswith('cmd_')):
-                        self._logger.debug("Found command file '{0}'."
-                                           .format(fname))
+                        self._logger.debug("Found command file '%s'.",
+                                           fname)
                         cmds.append((fname[4:-3], os.path.join(_dir, fname)))
             except OSError:
                 continue
@@ -85,6 +88,28 @@ class TpGroup(click.Group):
                options_metavar='[<options>]',
                subcommand_metavar='<command> [<args>]')
 @click.version_option(VERSION, message='%(prog)s %(version)s')
-def main():
+@click.option('--timings-file', metavar='<path>',
+              type=click.Path(dir_okay=False),
+              help='Append timing spans to a file as JSON lines.')
+@click.option('--timings', is_flag=True, default=False,
+              help='Print a breakdown of where time was spent.')
+@click.pass_context
+def main(ctx, timings, timings_file):
     """The entry point for the tp CLI."""
-    pass
+
+    if timings is True or timings_file is not None:
+        timing.enable()
+        ctx.call_on_close(lambda: report_timings(timings, timings_file))
+
+
+def report_timings(display, filename):
+    """Output the recorded timing spans.
+
+    :param bool display: Whether or not to print a breakdown to stderr.
+    :param str filename: A file to append the spans to as JSON lines.
+    """
+
+    if display is True:
+        click.echo(timing.format_report(), err=True)
+    if filename is not None:
+        timing.write_spans(filename, run=time.time(), argv=sys.argv[1:])
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""The tp entry point, which forwards commands to a running tp daemon.
+
+This module only imports the standard library, so starting a client is
+cheap. If no daemon is running, the command runs in-process instead.
+
+Functions:
+    * run: Run a tp command via the daemon or in-process.
+    * connect: Connect to the daemon's socket.
+
+"""
+
+import json
+import os
+import socket
+import sys
+
+#: The daemon's Unix socket.
+SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.tp', 'daemon.sock')
+
+
+def connect(socket_path=SOCKET_PATH):
+    """Connect to the daemon's socket.
+
+    :raises socket.error: if no daemon is listening.
+    """
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def forward(argv, socket_path=SOCKET_PATH):
+    """Run *argv* in the daemon and stream its output.
+
+    :returns: The command's exit code.
+    :raises socket.error: if the daemon isn't running.
+    """
+
+    sock = connect(socket_path)
+    try:
+        request = {'argv': argv, 'cwd': os.getcwd(),
+                   'color': sys.stdout.isatty()}
+        sock.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        for line in sock.makefile('rb'):
+            message = json.loads(line.decode('utf-8'))
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'exit' in message:
+                return message['exit']
+        return 1
+    finally:
+        sock.close()
+
+
+def run(argv=None):
+    """Run a tp command via the daemon, or in-process if it isn't running.
+
+    The daemon's own commands, and runs with TP_NO_DAEMON set, always run
+    in-process.
+    """
+
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ['daemon'] and not os.environ.get('TP_NO_DAEMON') and \
+            hasattr(socket, 'AF_UNIX'):
+        try:
+            code = forward(argv)
+        except (OSError, socket.error):
+            pass
+        else:
+            sys.exit(code)
+
+    from tp.cli import main
+    main(args=argv, prog_name='tp')
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Daemon command for tp."""
+
+import os
+import sys
+import time
+
+import click
+
+from tp import daemon, log
+from tp.client import SOCKET_PATH
+from tp.config import TpConfig
+
+
+@click.group(options_metavar='[<options>]',
+             subcommand_metavar='<command> [<args>]',
+             help='Manage a background tp process that keeps tp warm.')
+def main():
+    """Command-line entry point for the daemon command."""
+    pass
+
+
+@main.command(options_metavar='[<options>]',
+              help='Start the daemon.')
+@click.option('-f', '--foreground', is_flag=True, default=False,
+              help="Don't detach from the terminal.")
+@click.pass_context
+def start(ctx, foreground):
+    """Start the daemon in the background or foreground."""
+
+    if daemon.is_running():
+        click.echo('The tp daemon is already running.')
+        return
+
+    config = TpConfig(template='daemon')
+    cache_ttl = config.getfloat('daemon', 'cache_ttl', fallback=30.0)
+    server = daemon.TpDaemon(ctx.find_root().command, cache_ttl=cache_ttl)
+
+    if foreground is True or not hasattr(os, 'fork'):
+        click.echo('Listening on {0}.'.format(SOCKET_PATH))
+        server.serve_forever()
+        return
+
+    if os.fork() > 0:
+        # Wait for the daemon to start listening.
+        for _ in range(50):
+            if daemon.is_running():
+                click.echo('Started the tp daemon.')
+                return
+            time.sleep(0.1)
+        click.secho('The tp daemon failed to start.', fg='red')
+        sys.exit(1)
+
+    # Detach from the terminal.
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:
+        server.serve_forever()
+    finally:
+        log.shutdown()
+        os._exit(0)
+
+
+@main.command(options_metavar='[<options>]', help='Stop the daemon.')
+def stop():
+    """Stop the daemon."""
+    if daemon.stop():
+        click.echo('Stopped the tp daemon.')
+    else:
+        click.echo('The tp daemon is not running.')
+
+
+@main.command(options_metavar='[<options>]',
+              help='Show whether or not the daemon is running.')
+def status():
+    """Show the daemon's status."""
+    if daemon.is_running():
+        click.echo('The tp daemon is running.')
+    else:
+        click.echo('The tp daemon is not running.')
+        sys.exit(1)
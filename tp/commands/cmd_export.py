@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Export entity command for tp."""
+
+import sys
+
+import click
+
+from tp.api import ApiError
+from tp.app import TpApp
+from tp.export import Exporter, ExportError, FORMATS
+
+
+@click.option('--restart', is_flag=True, default=False,
+              help='Ignore any checkpoint and start over.')
+@click.option('-s', '--page-size', type=click.IntRange(1, 1000),
+              metavar='<int>', help='Number of entities in each request.')
+@click.option('-z', '--gzip', 'compress', is_flag=True, default=None,
+              help='Compress the output with gzip.')
+@click.option('-f', '--format', 'fmt', type=click.Choice(FORMATS),
+              help='Output format.')
+@click.option('-o', '--output', metavar='<file>', required=True,
+              type=click.Path(dir_okay=False), help='File to export to.')
+@click.argument('filters', nargs=-1, required=False,
+                metavar='[<entity>...<entity>] [<field><operator><value>]')
+@click.command('export', options_metavar='[<options>]',
+               help='Export Targetprocess entities to a file.')
+def main(filters, output, fmt, compress, page_size, restart):
+    """Command-line entry point for the export command."""
+
+    # Guess any settings that weren't given from the file extension.
+    name = output.lower()
+    if compress is None and name.endswith('.gz'):
+        compress = True
+        name = name[:-3]
+    if fmt is None:
+        fmt = next((f for f in FORMATS if name.endswith('.' + f)), None)
+
+    app = TpApp.shared(__name__)
+    exporter = Exporter(app, filters, output, fmt=fmt, compress=compress,
+                        page_size=page_size)
+    try:
+        count = exporter.run(restart=restart)
+    except ExportError as e:
+        click.secho('Error: {0}'.format(e), fg='red')
+        sys.exit(1)
+    except ApiError as e:
+        click.secho('{0}: {1}'.format(e.status, e.message), fg='red')
+        click.echo('Run the same command again to resume the export.')
+        sys.exit(1)
+
+    if exporter.resumed_count:
+        click.echo('Exported {0} entities to {1}, resuming after {2}.'.format(
+            count, output, exporter.resumed_count))
+    else:
+        click.echo('Exported {0} entities to {1}.'.format(count, output))
@@ -3,13 +3,24 @@
 
 from json import dumps
 import os
+import string
+import sys
+import time
 
 import click
 from tabulate import tabulate, TableFormat, Line, DataRow
 
+from tp import timing
+from tp.config import configparser
 from tp.api import ApiError
 from tp.app import TpApp
 from tp.formatter import Formatter
+from tp.watch import ListWatcher
+
+try:
+    from shutil import get_terminal_size
+except ImportError:
+    from click import get_terminal_size
 
 tp_tablefmt = TableFormat(
     lineabove=Line("", "─", "  ", ""),
@@ -23,6 +34,17 @@ tp_tablefmt = TableFormat(
 )
 
 
+@click.option('--prefetch', type=click.IntRange(0, None), metavar='<int>',
+              help='Number of top rows to fetch `tp show` output for in '
+              'the background.')
+@click.option('-a', '--accounts', metavar='<name>,...',
+              help="Accounts to list from, e.g. 'default,eu'. See the "
+              '[auth.<name>] config sections.')
+@click.option('-i', '--interval', type=click.FloatRange(1, None),
+              metavar='<seconds>', help='Seconds between checks in watch '
+              'mode.')
+@click.option('-w', '--watch', is_flag=True, default=False,
+              help='Keep the list up to date until interrupted.')
 @click.option('-j', '--json', is_flag=True, default=False,
               help='Output the response in JSON.')
 @click.option('-t', '--table', metavar='<table_name>',
@@ -40,25 +62,69 @@ tp_tablefmt = TableFormat(
                          '[<field><operator><value>]'))
 @click.command('ls', options_metavar='[<options>]',
                help='List Targetprocess entities.')
-def main(filters, pager, table, json, **data):
+def main(filters, pager, table, json, watch, interval, accounts, prefetch,
+         **data):
     """Command-line entry point for the list command."""
 
-    app = TpApp(__name__)
+    app = TpApp.shared(__name__)
+
+    if watch is True:
+        if json is True or accounts:
+            raise click.UsageError('--watch can\'t be combined with --json '
+                                   'or --accounts.')
+        watch_list(app, filters, table, interval, **data)
+        return
 
     # Search Tp for entities matching user's filters.
     try:
-        results = app.list(filters, **data)
+        if accounts:
+            accounts = [a.strip() for a in accounts.split(',') if a.strip()]
+            results = app.list_accounts(accounts, filters, compact=not json,
+                                        intern=True, **data)
+        else:
+            results = app.list(filters, compact=not json, intern=True,
+                               **data)
     except ApiError as e:
         click.secho('{0}: {1}'.format(e.status, e.message), fg='red')
-        exit(1)
+        sys.exit(1)
+    except configparser.NoSectionError as e:
+        click.secho('Error: Unknown account. Add a [{0}] section to your '
+                    'config.'.format(e.section), fg='red')
+        sys.exit(1)
 
     if json is True:
         indent_step = app.config.get_from_template('indent', cast='int')
         click.echo(dumps(results, indent=indent_step))
-        exit(0)
+        sys.exit(0)
+
+    # Keep the results for interactive use, e.g. `tp shell`.
+    app.results = results
 
     if pager is None:
         pager = app.config.get_from_template('pager', cast='bool')
+
+    out = format_table(app, results, table)
+    echo_table(out, pager)
+
+    # Get the top rows ready for a following `tp show`. Entities from other
+    # accounts can't be shown, so they're skipped.
+    if prefetch is None:
+        prefetch = app.config.get_from_template('prefetch', cast='int',
+                                                fallback=0)
+    if prefetch and not accounts:
+        app.prefetch([entity['Id'] for entity in results[:prefetch]])
+
+
+def format_table(app, results, table=None):
+    """Format entities as a table using the app's current template.
+
+    :param TpApp app: The app whose template defines the fields and headers.
+    :param list results: The entities to format.
+    :param table: The table style to use. Defaults to the template's style.
+    :returns: The formatted table.
+    :rtype: str
+    """
+
     if table is None:
         table = app.config.get_from_template('table')
     if table == 'tp_table':
@@ -68,28 +134,47 @@ def main(filters, pager, table, json, **data):
     _fields = app.config.get_from_template('fields', cast='list')
     fields = app.format_fields_for_output(_fields)
     headers = app.config.get_from_template('headers', cast='list')
+    # Show where each entity came from when listing from several accounts.
+    if results and 'Account' in results[0]:
+        fields.insert(0, '{Account}')
+        headers.insert(0, 'Account')
     if len(headers) != len(fields):
         click.secho('Warning: The number of headings and fields do not match.',
                     fg='yellow')
 
     # Generate the output data for each entity.
     Formatter.date_format = app.config.get_from_template('date')
+    # Nested objects, e.g. owners, are shared between entities and cache
+    # their formatted values, so each is only formatted once.
     output_data = []
-    for entity in results:
-        row = []
-        for field in fields:
-            try:
-                row.append(field.format(**Formatter(entity)))
-            except KeyError:
-                row.append('')
-        output_data.append(row)
+    vformat = string.Formatter().vformat
+    with timing.span('ls.rows', items=len(results)):
+        for entity in results:
+            fentity = Formatter(entity)
+            row = []
+            for field in fields:
+                try:
+                    row.append(vformat(field, (), fentity))
+                except KeyError:
+                    row.append('')
+            output_data.append(row)
+
+    with timing.span('ls.tabulate', items=len(output_data)):
+        return tabulate(output_data, headers=headers, tablefmt=table)
+
+
+def echo_table(out, pager=False):
+    """Output a formatted table.
+
+    :param str out: The formatted table.
+    :param bool pager: Whether or not to output the table via a pager.
+    """
 
     # Add a line between the command and table output.
     click.echo()
 
-    out = tabulate(output_data, headers=headers, tablefmt=table)
     if pager is True:
-        original_less_options = os.environ['LESS']
+        original_less_options = os.environ.get('LESS', '')
         os.environ['LESS'] = '-SRXF'
         click.echo_via_pager(out)
         os.environ['LESS'] = original_less_options
@@ -98,3 +183,81 @@ def main(filters, pager, table, json, **data):
 
     # Provide a little space at the end of the list.
     click.echo()
+
+
+def watch_list(app, filters, table=None, interval=None, **data):
+    """Output a list of entities and keep it up to date until interrupted.
+
+    Only the entities modified since the last check are requested, and only
+    the lines that changed are redrawn.
+
+    :param TpApp app: The app to list entities with.
+    :param list filters: The filters to list entities with.
+    :param table: The table style to use.
+    :param float interval: Seconds between checks. Defaults to the template's
+        watch_interval.
+    :param data: Any other TpApp.list() options.
+    """
+
+    watcher = ListWatcher(app, filters, **data)
+    try:
+        watcher.load()
+    except ApiError as e:
+        click.secho('{0}: {1}'.format(e.status, e.message), fg='red')
+        sys.exit(1)
+    if interval is None:
+        interval = app.config.get_from_template('watch_interval',
+                                                cast='float')
+
+    def render(status):
+        out = format_table(app, watcher.results, table)
+        return [''] + out.split('\n') + ['', status]
+
+    lines = render('Checking every {0:g}s. Press Ctrl+C to stop.'.format(
+        interval))
+    click.echo('\n'.join(lines))
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                changed = watcher.poll()
+            except ApiError as e:
+                click.secho('{0}: {1}'.format(e.status, e.message), fg='red')
+                continue
+            if not changed:
+                continue
+            new_lines = render('{0} changed at {1}.'.format(
+                len(changed), time.strftime('%H:%M:%S')))
+            redraw(lines, new_lines)
+            lines = new_lines
+    except KeyboardInterrupt:
+        click.echo()
+
+
+def redraw(lines, new_lines):
+    """Replace the output *lines* with *new_lines*.
+
+    On a terminal only the lines that differ are rewritten, in place.
+    Otherwise, or if the old lines don't fit on the screen, all of
+    *new_lines* are output.
+
+    :param list lines: The lines that were last output.
+    :param list new_lines: The lines to output instead.
+    """
+
+    if (not click.get_text_stream('stdout').isatty() or
+            len(lines) >= get_terminal_size((80, 24))[1]):
+        click.echo('\n'.join(new_lines))
+        return
+
+    # Move to the start of the old output, then write over the lines that
+    # changed and step over the rest.
+    out = ['\x1b[{0}A\r'.format(len(lines))]
+    for index, line in enumerate(new_lines):
+        if index >= len(lines) or lines[index] != line:
+            out.append('\x1b[2K' + line)
+        out.append('\n')
+    if len(new_lines) < len(lines):
+        # Clear the old lines that are left over.
+        out.append('\x1b[J')
+    click.echo(''.join(out), nl=False)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""Interactive shell command for tp."""
+
+import cmd
+import shlex
+
+import click
+
+from tp.app import TpApp
+from tp.commands import cmd_ls
+from tp.formatter import Formatter
+
+try:
+    import readline
+except ImportError:
+    readline = None
+
+#: Commands that can't be run from within the shell.
+EXCLUDED_COMMANDS = ('daemon', 'shell')
+
+
+class TpShell(cmd.Cmd):
+    """A REPL that runs tp commands against long-lived app objects.
+
+    The results of the last `ls` are kept, so rows can be shown by number and
+    re-sorted without new requests.
+    """
+
+    intro = ('Type a tp command, e.g. "ls bug", "show <row#>" or "sort '
+             '<field>". Type "help" for more or "exit" to quit.')
+    prompt = 'tp> '
+
+    def __init__(self, ctx):
+        """Store the CLI context used to look up commands.
+
+        :param click.Context ctx: The root tp command's context.
+        """
+
+        cmd.Cmd.__init__(self)
+        self.ctx = ctx
+        self.group = ctx.command
+        if readline is not None:
+            readline.set_completer_delims(' \t\n')
+
+    @property
+    def ls_app(self):
+        """The app object used by `ls`, if it has run."""
+        # TpGroup loads each command as a module named after the command.
+        return TpApp._shared.get(('ls', ()))
+
+    @property
+    def results(self):
+        """The results of the last `ls`."""
+        return getattr(self.ls_app, 'results', None) or []
+
+    def get_command_names(self):
+        """Get the names of the commands available in the shell."""
+        names = self.group.list_commands(self.ctx) + ['sort', 'exit']
+        return [name for name in names if name not in EXCLUDED_COMMANDS]
+
+    def run_command(self, name, args):
+        """Run tp command *name* with *args*."""
+        command = self.group.get_command(self.ctx, name)
+        if command is None or name in EXCLUDED_COMMANDS:
+            click.secho("Unknown command '{0}'.".format(name), fg='red')
+            return
+        try:
+            command.main(args=args, prog_name='{0} {1}'.format(
+                self.ctx.info_name, name), standalone_mode=False)
+        except click.ClickException as e:
+            e.show()
+        except click.Abort:
+            click.echo('Aborted!')
+        except SystemExit:
+            pass
+
+    def split(self, line):
+        """Split *line* like a shell would, reporting any errors."""
+        try:
+            return shlex.split(line)
+        except ValueError as e:
+            click.secho('Error: {0}'.format(e), fg='red')
+            return None
+
+    def emptyline(self):
+        pass
+
+    def default(self, line):
+        args = self.split(line)
+        if args:
+            self.run_command(args[0], args[1:])
+
+    def do_show(self, line):
+        """show <row#|id> [<options>]: Show an entity.
+
+        Numbers up to the size of the last listing refer to its rows.
+        """
+
+        args = self.split(line)
+        if args is None:
+            return
+        results = self.results
+        for index, arg in enumerate(args):
+            if arg.isdigit():
+                if 0 < int(arg) <= len(results):
+                    args[index] = str(results[int(arg) - 1]['Id'])
+                break
+        self.run_command('show', args)
+
+    def do_sort(self, line):
+        """sort <field> [-r]: Re-sort the last listing without a request."""
+        args = self.split(line)
+        if not args:
+            click.echo('Usage: sort <field> [-r]')
+            return
+        field = args[0]
+        reverse = '-r' in args[1:] or '--reverse' in args[1:]
+        results = self.results
+        if not results:
+            click.echo('Nothing to sort. Run "ls" first.')
+            return
+
+        def key(entity):
+            value = Formatter(entity).get(field, raw=True)
+            return (value is None, value)
+
+        results = list(results)
+        try:
+            results.sort(key=key, reverse=reverse)
+        except TypeError:
+            results.sort(key=lambda e: str(key(e)), reverse=reverse)
+        self.ls_app.results = results
+        cmd_ls.echo_table(cmd_ls.format_table(self.ls_app, results))
+
+    def do_exit(self, line):
+        """exit: Leave the shell."""
+        return True
+
+    do_quit = do_exit
+
+    def do_EOF(self, line):
+        click.echo()
+        return True
+
+    def completenames(self, text, *ignored):
+        return [name + ' ' for name in self.get_command_names()
+                if name.startswith(text)]
+
+    def completedefault(self, text, line, begidx, endidx):
+        """Complete with the IDs and names from the last listing."""
+        words = set()
+        for entity in self.results:
+            words.add(str(entity['Id']))
+            name = entity.get('Name') or ''
+            words.update(name.split())
+        return sorted(word for word in words if word.startswith(text))
+
+    complete_show = complete_ls = completedefault
+
+
+@click.command(options_metavar='[<options>]',
+               help='Run tp commands in an interactive shell.')
+@click.pass_context
+def main(ctx):
+    """Command-line entry point for the shell command."""
+
+    TpApp.reuse = True
+    TpShell(ctx.find_root()).cmdloop()
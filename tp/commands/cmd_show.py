@@ -3,12 +3,19 @@
 
 from collections import OrderedDict
 from json import dumps
+import sys
 from textwrap import fill
 
 import click
 import click.utils
 import pyperclip
 
+try:
+    from shutil import get_terminal_size
+except ImportError:
+    from click import get_terminal_size
+
+from tp import timing
 from tp.api import ApiError
 from tp.app import TpApp
 from tp.formatter import Formatter
@@ -26,7 +33,7 @@ def format_output(s, current_indent):
     indent = ' ' * current_indent
 
     # Calculate the output width.
-    w = click.get_terminal_size()[0]
+    w = get_terminal_size()[0]
     size = min(max(w - 20, min(80, w)) - current_indent, 130)
 
     # Wrap the paragraphs so lines are not longer than the calculated width.
@@ -113,7 +120,7 @@ def print_comment(comment, indent, indent_step):
 def main(id, copy, browser, comments, no_comments, json):
     """Command-line entry point for the show command."""
 
-    app = TpApp(__name__)
+    app = TpApp.shared(__name__)
 
     indent_step = app.config.get_from_template('indent', cast='int')
 
@@ -130,35 +137,22 @@ def main(id, copy, browser, comments, no_comments, json):
     if browser is True or copy is True:
         url = app.get_url(id)
         if browser is True:
-            exit(click.launch(url))
+            sys.exit(click.launch(url))
         if copy is True:
             pyperclip.copy(url)
             click.echo('URL copied to clipboard.')
-            exit(0)
-
-    # Define the fields to be included in the API response.
-    include = (
-        'Comments[CreateDate,Description,Id,Owner,ParentId]',
-        'CreateDate',
-        'Description',
-        'EntityState[Name]',
-        'EntityType[Name]',
-        'Id',
-        'LastStateChangeDate',
-        'Name',
-        'Owner[Firstname,LastName]',
-    )
+            sys.exit(0)
 
     # Get the requested entity and display any errors.
     try:
-        entity = app.show(id, raw=json, include=include)
+        entity = app.show(id, raw=json, include=app.SHOW_INCLUDE)
     except ApiError as e:
         click.echo('{0}: {1}'.format(e.status, e.message))
-        exit(1)
+        sys.exit(1)
 
     if json is True:
         click.echo(dumps(entity, indent=indent_step))
-        exit(0)
+        sys.exit(0)
 
     # Configure the Formatter class and wrap the entity.
     Formatter.date_format = app.config.get_from_template('date')
@@ -189,7 +183,9 @@ def main(id, copy, browser, comments, no_comments, json):
 
     # Output the entity description.
     current_indent += indent_step
-    description_out = format_output(fentity['Description'], current_indent)
+    with timing.span('show.description'):
+        description_out = format_output(fentity['Description'],
+                                        current_indent)
     click.echo(description_out)
 
     # Only display comments if the user requested it.
@@ -208,4 +204,5 @@ def main(id, copy, browser, comments, no_comments, json):
                     parent = child_map
                 parent[index] = (comment['Id'], OrderedDict())
 
-        print_comments(comments, child_map, current_indent, indent_step)
+        with timing.span('show.comments', items=len(comments)):
+            print_comments(comments, child_map, current_indent, indent_step)
@@ -80,7 +80,7 @@ class TpConfig(ConfigParser):
         except configparser.Error:
             self.log('warning', 'Unable to read user configuration files.')
 
-    def log(self, level, message):
+    def log(self, level, message, *args):
         """Log a message using the logger or stderr.
 
         If no parent logger exists and the level is not 'info' or 'debug',
@@ -90,16 +90,18 @@ class TpConfig(ConfigParser):
 
         :param str level: The logging level for the message, e.g. 'debug' or
             'warning'.
-        :param str message: The message to log.
+        :param str message: The message to log, with %-style placeholders for
+            *args*. It's only formatted if it's output.
+        :param args: The values for the message's placeholders.
         """
 
         if self._logger.parent.name == 'root':
             if level.lower() not in ('info', 'debug'):
-                print(message, file=sys.stderr)
+                print(message % args if args else message, file=sys.stderr)
             return
 
         level = getattr(logging, level.upper())
-        self._logger.log(level, message)
+        self._logger.log(level, message, *args)
 
     def get(self, section, option, vars=None, fallback=_UNSET):
         """Get an option's value from the config parser.
@@ -162,6 +164,25 @@ class TpConfig(ConfigParser):
         return self._get_conv(section, option, self._convert_to_boolean,
                               vars=vars, fallback=fallback)
 
+    def get_accounts(self):
+        """Get the names of the accounts in [auth.<name>] sections."""
+        return [section[5:] for section in self.sections()
+                if section.startswith('auth.')]
+
+    def get_auth_section(self, account=None):
+        """Get the section with the authentication details for *account*.
+
+        :param str account: The account's name, or None or 'default' for the
+            [auth] section.
+        """
+
+        if account in (None, 'default'):
+            return 'auth'
+        section = 'auth.{0}'.format(account)
+        if not self.has_section(section):
+            raise configparser.NoSectionError(section)
+        return section
+
     def get_from_template(self, option, cast=_UNSET, vars=None,
                           fallback=_UNSET):
         """Get an option from the config's assigned template.
@@ -175,10 +196,9 @@ class TpConfig(ConfigParser):
         """
 
         self.log('debug', 'Getting from template:\n'
-                          '\ttemplate: {0}\n'
-                          '\toption: {1}\n'
-                          '\tcast: {2}'
-                          .format(self.template, option, cast))
+                          '\ttemplate: %s\n'
+                          '\toption: %s\n'
+                          '\tcast: %s', self.template, option, cast)
 
         if cast == 'bool':
             get = self.getboolean
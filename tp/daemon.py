@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""A resident tp process that runs commands sent over a Unix socket.
+
+The daemon keeps the CLI's commands, TpApp objects (with their config,
+logger and API session) and a response cache warm between commands. The
+thin client in tp.client forwards its argv to the daemon and streams the
+output back.
+
+Protocol: the client sends one JSON line, e.g.
+{"argv": ["ls", "bug"], "cwd": "/home/me", "color": true}. The daemon
+answers with JSON lines: {"out": "..."} and {"err": "..."} for output and a
+final {"exit": 0} with the exit code.
+
+Classes:
+    * TpDaemon: The daemon server.
+
+Functions:
+    * is_running: Whether or not a daemon is answering on the socket.
+    * stop: Ask the daemon to stop.
+
+"""
+
+import io
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import click
+
+from tp.app import TpApp
+from tp.cache import ResponseCache
+from tp.client import SOCKET_PATH, connect
+
+
+class _StreamWriter(object):
+    """A file-like object that sends output to the client as JSON lines."""
+
+    def __init__(self, wfile, stream):
+        self.wfile = wfile
+        self.stream = stream
+
+    def write(self, text):
+        if isinstance(text, bytes):
+            text = text.decode('utf-8', 'replace')
+        if text:
+            line = json.dumps({self.stream: text}) + '\n'
+            self.wfile.write(line.encode('utf-8'))
+        return len(text)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def isatty(self):
+        return False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        request = json.loads(line.decode('utf-8'))
+        if request.get('control') == 'stop':
+            self._send({'exit': 0})
+            threading.Thread(target=self.server.shutdown).start()
+            return
+        if request.get('control') == 'ping':
+            self._send({'exit': 0, 'pid': os.getpid()})
+            return
+
+        code = self.server.tp_daemon.run(request, self.wfile)
+        self._send({'exit': code})
+
+    def _send(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode('utf-8'))
+
+
+class TpDaemon(object):
+    """Runs tp commands sent by clients against warm app objects.
+
+    Commands are run one at a time, because they write to sys.stdout.
+    """
+
+    def __init__(self, command, socket_path=SOCKET_PATH, cache_ttl=30.0):
+        """Store the CLI command and prepare the shared state.
+
+        :param click.Command command: The tp CLI's root command.
+        :param str socket_path: The Unix socket to listen on.
+        :param float cache_ttl: Seconds API responses are cached for. Zero
+            disables the response cache.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self.command = command
+        self.socket_path = socket_path
+
+        TpApp.reuse = True
+        if cache_ttl > 0:
+            TpApp.response_cache = ResponseCache(cache_ttl)
+
+    def serve_forever(self):
+        """Listen on the socket until a client asks the daemon to stop."""
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        server = socketserver.UnixStreamServer(self.socket_path, _Handler)
+        server.tp_daemon = self
+        os.chmod(self.socket_path, 0o600)
+        self._logger.info('Daemon listening on %s.', self.socket_path)
+        try:
+            server.serve_forever(poll_interval=0.2)
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    def run(self, request, wfile):
+        """Run a command and stream its output to *wfile*.
+
+        :param dict request: The client's request.
+        :param wfile: The client connection's writable file.
+        :returns: The command's exit code.
+        :rtype: int
+        """
+
+        saved = sys.stdin, sys.stdout, sys.stderr, os.getcwd()
+        sys.stdin = io.StringIO()
+        sys.stdout = _StreamWriter(wfile, 'out')
+        sys.stderr = _StreamWriter(wfile, 'err')
+        try:
+            os.chdir(request.get('cwd') or saved[3])
+            self.command.main(args=request['argv'], prog_name='tp',
+                              standalone_mode=False,
+                              color=request.get('color', False))
+            return 0
+        except SystemExit as e:
+            code = e.code
+            if code is None:
+                return 0
+            if not isinstance(code, int):
+                sys.stderr.write('{0}\n'.format(code))
+                return 1
+            return code
+        except click.ClickException as e:
+            e.show()
+            return e.exit_code
+        except click.Abort:
+            sys.stderr.write('Aborted!\n')
+            return 1
+        except Exception as e:
+            self._logger.exception('Command failed in the daemon.')
+            sys.stderr.write('Error: {0}\n'.format(e))
+            return 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = saved[:3]
+            os.chdir(saved[3])
+
+
+def is_running(socket_path=SOCKET_PATH):
+    """Whether or not a daemon is answering on *socket_path*."""
+    try:
+        sock = connect(socket_path)
+    except (OSError, socket.error):
+        return False
+    try:
+        sock.sendall(b'{"control": "ping"}\n')
+        return bool(sock.makefile('rb').readline())
+    finally:
+        sock.close()
+
+
+def stop(socket_path=SOCKET_PATH):
+    """Ask the daemon on *socket_path* to stop.
+
+    :returns: Whether or not a daemon was running.
+    """
+
+    try:
+        sock = connect(socket_path)
+    except (OSError, socket.error):
+        return False
+    try:
+        sock.sendall(b'{"control": "stop"}\n')
+        sock.makefile('rb').readline()
+    finally:
+        sock.close()
+    return True
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""Export Tp entities to a file page by page.
+
+Only one page of entities is held in memory at a time. Pages are requested
+in order of ID with a "(Id gt <last ID>)" condition rather than an offset, so
+entities created during an export don't shift the pages.
+
+After each page is written, a checkpoint file records the last ID and the
+output's size. An interrupted export started again with the same filters
+cuts the output back to that size and carries on from the next page. Gzipped
+output is written as one gzip member per page, so a checkpoint always falls
+on a member boundary.
+
+Classes:
+    * Checkpoint: The saved progress of an export.
+    * Exporter: Writes the entities matching a filter to a file.
+
+"""
+
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import string
+
+from tp import api, timing
+from tp.formatter import Formatter
+
+#: The supported output formats.
+FORMATS = ('ndjson', 'csv')
+
+
+class ExportError(Exception):
+    """An export can't be started or resumed."""
+
+
+class Checkpoint(object):
+    """The saved progress of an export, stored as JSON."""
+
+    def __init__(self, filename):
+        """Store the checkpoint's filename.
+
+        :param str filename: The checkpoint file.
+        """
+
+        self.filename = filename
+
+    def load(self):
+        """Get the saved progress or None if there isn't any."""
+        try:
+            with open(self.filename) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save(self, **state):
+        """Save the progress *state*, replacing the file atomically."""
+        tmp = self.filename + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.filename)
+
+    def remove(self):
+        """Remove the checkpoint file, if it exists."""
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class Exporter(object):
+    """Writes the entities matching a filter to a file as NDJSON or CSV.
+
+    For example:
+
+        > exporter = Exporter(app, ['bug'], 'bugs.ndjson.gz')
+        > count = exporter.run()
+
+    """
+
+    def __init__(self, app, filters, output, fmt=None, compress=None,
+                 page_size=None):
+        """Store the export's settings.
+
+        Settings that are None are read from the filter's template.
+
+        :param TpApp app: The app used to get entities.
+        :param list filters: The filters to export entities with.
+        :param str output: The output filename.
+        :param str fmt: The output format. One of FORMATS.
+        :param bool compress: Whether or not to gzip the output.
+        :param int page_size: The number of entities in each request.
+        """
+
+        self.app = app
+        self.filters = filters
+        self.output = output
+        self.fmt = fmt
+        self.compress = compress
+        self.page_size = page_size
+        self.checkpoint = Checkpoint(output + '.checkpoint')
+        self.resumed_count = 0
+
+    def _configure(self):
+        """Get the API options and fill in any settings from the template."""
+        config = self.app.config
+        data = self.app.plan_list(self.filters, number=0, offset=0,
+                                  sort='Id', reverse=False)
+        if self.page_size is None:
+            self.page_size = config.get_from_template('page_size', cast='int')
+        data['take'] = self.page_size
+        if self.fmt is None:
+            self.fmt = config.get_from_template('format')
+        if self.fmt not in FORMATS:
+            raise ExportError("Unknown export format '{0}'.".format(self.fmt))
+        if self.compress is None:
+            self.compress = config.get_from_template('gzip', cast='bool')
+        return data
+
+    def _get_key(self, data):
+        """Get a key that identifies the export's query and output format."""
+        key = json.dumps([data['where'], data.get('include'), self.fmt,
+                          self.compress], sort_keys=True)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _get_formatter(self):
+        """Get a function that formats a page of items as bytes."""
+        if self.fmt == 'ndjson':
+            def format_page(items, first):
+                lines = [json.dumps(item, ensure_ascii=False) + '\n'
+                         for item in items]
+                return ''.join(lines).encode('utf-8')
+            return format_page
+
+        config = self.app.config
+        fields = self.app.format_fields_for_output(
+            config.get_from_template('fields', cast='list'))
+        headers = config.get_from_template('headers', cast='list')
+        Formatter.date_format = config.get_from_template('date')
+        vformat = string.Formatter().vformat
+
+        def format_page(items, first):
+            out = io.StringIO()
+            writer = csv.writer(out, lineterminator='\n')
+            if first:
+                writer.writerow(headers)
+            for item in items:
+                fitem = Formatter(item)
+                row = []
+                for field in fields:
+                    try:
+                        row.append(vformat(field, (), fitem))
+                    except KeyError:
+                        row.append('')
+                writer.writerow(row)
+            return out.getvalue().encode('utf-8')
+        return format_page
+
+    def _write(self, f, chunk):
+        """Write *chunk* to *f*, gzipped as its own member if need be."""
+        if self.compress:
+            with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=6) as gz:
+                gz.write(chunk)
+        else:
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def run(self, restart=False):
+        """Export the entities, resuming from a checkpoint if there is one.
+
+        :param bool restart: Whether or not to ignore any checkpoint.
+        :returns: The total number of entities exported.
+        :rtype: int
+        """
+
+        data = self._configure()
+        key = self._get_key(data)
+        format_page = self._get_formatter()
+        where = data['where']
+
+        state = None if restart else self.checkpoint.load()
+        if state is not None and state.get('key') != key:
+            raise ExportError(
+                "The checkpoint '{0}' is for a different export. Remove it "
+                "or start over with --restart.".format(
+                    self.checkpoint.filename))
+
+        if state is None:
+            last_id, count = None, 0
+            f = open(self.output, 'wb')
+        else:
+            last_id, count = state['last_id'], state['count']
+            self.resumed_count = count
+            f = open(self.output, 'r+b')
+            f.truncate(state['size'])
+            f.seek(state['size'])
+
+        try:
+            while True:
+                if last_id is not None:
+                    data['where'] = '{0} and (Id gt {1})'.format(where,
+                                                                 last_id)
+                with timing.span('export.page') as span:
+                    response = api.fetch(self.app.api, api.Assignable,
+                                         raw=True, **data)
+                    items = self.app.api.decode_content(response)['Items']
+                    if items:
+                        self._write(f, format_page(items, count == 0))
+                    span.set(items=len(items))
+                if not items:
+                    break
+
+                last_id = items[-1]['Id']
+                count += len(items)
+                self.checkpoint.save(key=key, last_id=last_id, count=count,
+                                     size=f.tell())
+                if len(items) < self.page_size:
+                    break
+        finally:
+            f.close()
+
+        self.checkpoint.remove()
+        return count
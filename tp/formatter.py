@@ -6,6 +6,11 @@ import re
 
 import html2text
 
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
 try:
     basestring
 except NameError:
@@ -30,18 +35,41 @@ class Formatter(dict):
     # client code if needed.
     date_format = '%Y-%m-%d %H:%M:%S'
 
-    def __init__(self, entity, default=''):
+    def __init__(self, entity, default='', memoize=False):
         """Store the Tp entity.
 
         :param TpEntity entity: The Tp entity this formatter should wrap.
         :param default: A default, fallback value to be returned when a key is
             not found. Defaults to a blank string so that it can easily be
             combined with other string when outputted.
+        :param bool memoize: Whether or not to cache transformed values. This
+            is used for shared, read-only reference objects.
         """
 
         self.default_value = default
+        self._memo = {} if memoize is True else None
         super(Formatter, self).__init__(entity)
 
+    def _wrap(self, value):
+        """Wrap a nested object in a formatter.
+
+        Shared reference objects (see tp.api.Interner) cache their formatter,
+        so their values are only transformed once no matter how many entities
+        refer to them.
+        """
+
+        formatters = getattr(value, 'formatters', None)
+        if formatters is None:
+            return Formatter(value)
+        key = (self.date_format, self.default_value)
+        formatter = formatters.get(key)
+        if formatter is None:
+            formatter = Formatter(value, default=self.default_value,
+                                  memoize=True)
+            formatter.date_format = self.date_format
+            formatters[key] = formatter
+        return formatter
+
     def _override_key(self, key):
         """Override a key if it wasn't found.
 
@@ -86,8 +114,8 @@ class Formatter(dict):
         :returns: The transformed value.
         """
 
-        if isinstance(value, dict):
-            return Formatter(value)
+        if isinstance(value, Mapping):
+            return self._wrap(value)
         elif not isinstance(value, basestring):
             return value
         elif value.startswith('/Date('):
@@ -112,6 +140,18 @@ class Formatter(dict):
         :returns: The value.
         """
 
+        if self._memo is not None:
+            memo_key = (key, raw, fmt_option)
+            try:
+                return self._memo[memo_key]
+            except KeyError:
+                value = self._getitem(key, raw, fmt_option)
+                self._memo[memo_key] = value
+                return value
+        return self._getitem(key, raw, fmt_option)
+
+    def _getitem(self, key, raw, fmt_option):
+        """Get and transform a value. See __getitem__()."""
         try:
             value = super(Formatter, self).__getitem__(key)
         except KeyError:
@@ -153,3 +193,32 @@ class Formatter(dict):
                 pass
 
         return value
+
+
+_date_re = re.compile(r'/Date\((-?\d+)')
+
+
+def get_timestamp(value):
+    """Get the milliseconds in a Tp date string, e.g. '/Date(1234-0500)/'.
+
+    :returns: The timestamp or None if *value* isn't a Tp date.
+    """
+
+    try:
+        m = _date_re.match(value)
+    except TypeError:
+        return None
+    return int(m.group(1)) if m is not None else None
+
+
+def sort_key(field):
+    """Get a key function that sorts entities by *field*."""
+
+    def key(entity):
+        value = Formatter(entity).get(field, raw=True)
+        timestamp = get_timestamp(value)
+        if timestamp is not None:
+            value = timestamp
+        # Sort empty values first.
+        return (value is not None, value)
+    return key
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Logging setup for tp.
+
+Log records are put on a queue by a handler on the 'tp' logger and written
+to the log file by a background thread, so logging never waits on disk. The
+handler is installed once per process, however many TpApp objects are
+created.
+
+Functions:
+    * setup: Install or update the tp log handler.
+    * shutdown: Write any queued records and stop the writer thread.
+
+"""
+
+import atexit
+import logging
+import os
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    QueueHandler = QueueListener = None
+
+_lock = threading.Lock()
+_state = {'key': None, 'handler': None, 'listener': None}
+
+
+def setup(filename, fmt=None, datefmt=None, level='warning'):
+    """Log the 'tp' logger's records to *filename* in the background.
+
+    Calling this again with the same file and format only updates the level.
+
+    :param str filename: The log file.
+    :param str fmt: The log record format.
+    :param str datefmt: The date format for log records.
+    :param str level: The lowest level to log, e.g. 'debug'.
+    """
+
+    logger = logging.getLogger('tp')
+    logger.setLevel(getattr(logging, level.upper()))
+
+    key = (filename, fmt, datefmt)
+    with _lock:
+        if _state['key'] == key:
+            return
+        _remove()
+
+        file_handler = logging.FileHandler(filename, delay=True)
+        file_handler.setFormatter(logging.Formatter(fmt=fmt,
+                                                    datefmt=datefmt))
+        if QueueHandler is None:
+            # Python 2 has no queue handlers, so write directly.
+            handler, listener = file_handler, None
+        else:
+            records = queue.Queue()
+            handler = QueueHandler(records)
+            listener = QueueListener(records, file_handler)
+            listener.start()
+
+        logger.addHandler(handler)
+        _state.update(key=key, handler=handler, listener=listener)
+
+
+def _remove():
+    """Remove the installed handler and stop its writer thread."""
+    handler, listener = _state['handler'], _state['listener']
+    if handler is not None:
+        logging.getLogger('tp').removeHandler(handler)
+    if listener is not None:
+        listener.stop()
+        for file_handler in listener.handlers:
+            file_handler.close()
+    elif handler is not None:
+        handler.close()
+    _state.update(key=None, handler=None, listener=None)
+
+
+def shutdown():
+    """Write any queued records and stop the writer thread."""
+    with _lock:
+        _remove()
+
+
+def _after_fork():
+    """Start a writer thread in a forked child, which doesn't inherit it."""
+    listener = _state['listener']
+    if listener is not None:
+        listener._thread = None
+        listener.start()
+
+
+atexit.register(shutdown)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
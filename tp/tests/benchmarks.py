@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""End-to-end benchmarks for tp against a local fake Targetprocess server.
+
+Each scenario is run once for wall time and once under tracemalloc for peak
+memory. Results are compared against the stored baselines.
+
+Usage:
+
+    $ python -m tp.tests.benchmarks
+    $ python -m tp.tests.benchmarks --sizes 1000 --latency 0.02
+    $ python -m tp.tests.benchmarks --save
+
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from click.testing import CliRunner
+
+from tp import api
+from tp.cli import main as tp_main
+from tp.config import TpConfig
+from tp.tests.fakeserver import FakeTpServer
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'benchmark_baselines.json')
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+CONFIG = """\
+[auth]
+subdomain = fake
+token = fake-token
+username = fake
+user_id = 1
+uri = {uri}
+
+[app]
+log_file = {log_file}
+cache_dir = {cache_dir}
+
+[api]
+rate_limit = 0
+"""
+
+
+class Environment(object):
+    """Points tp's config at a fake server for the duration of a run."""
+
+    def __init__(self, server, extra_config=''):
+        """Store the server to use.
+
+        :param FakeTpServer server: A running fake server.
+        :param str extra_config: More config, e.g. other account sections.
+        """
+
+        self.server = server
+        self.extra_config = extra_config
+        self.tmp_dir = None
+        self._confs = None
+
+    def __enter__(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='tp-bench-')
+        conf = os.path.join(self.tmp_dir, 'tp.conf')
+        with open(conf, 'w') as f:
+            f.write(CONFIG.format(
+                uri=self.server.uri,
+                log_file=os.path.join(self.tmp_dir, 'tp.log'),
+                cache_dir=os.path.join(self.tmp_dir, 'cache')))
+            f.write(self.extra_config)
+        self._confs = (TpConfig.system_confs, TpConfig.user_confs)
+        TpConfig.system_confs = ()
+        TpConfig.user_confs = (conf, )
+        return self
+
+    def __exit__(self, *exc_info):
+        TpConfig.system_confs, TpConfig.user_confs = self._confs
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def run_cli(args):
+    """Run the tp CLI in-process and fail loudly if it fails."""
+    result = CliRunner().invoke(tp_main, args)
+    if result.exit_code != 0:
+        raise RuntimeError('tp {0} failed:\n{1}'.format(' '.join(args),
+                                                        result.output))
+    return result
+
+
+def scenario_ls(server, size):
+    """List *size* entities with `tp ls`."""
+    run_cli(['ls', str(size)])
+
+
+def scenario_show(server, size):
+    """Show one entity with comments with `tp show`."""
+    run_cli(['show', str(size // 2 or 1)])
+
+
+def scenario_fetch(server, size):
+    """Page through *size* entities with tp.api.fetch."""
+    tp_api = api.TpApi('fake', token='fake-token', uri=server.uri,
+                       throttle=api.Throttle(rate_limit=0))
+    take = min(size, server.page_size)
+    skip = 0
+    count = 0
+    while True:
+        items = api.fetch(tp_api, api.Assignable, take=take, skip=skip,
+                          include=['Id', 'Name', 'EntityState[Name]',
+                                   'Owner[FirstName,LastName]'])
+        count += len(items)
+        skip += take
+        if len(items) < take or count >= size:
+            return count
+
+
+SCENARIOS = (
+    ('ls', scenario_ls),
+    ('show', scenario_show),
+    ('fetch', scenario_fetch),
+)
+
+
+def measure(server, func, size):
+    """Measure a scenario's wall time, traffic and peak memory.
+
+    :returns: A dict of the measurements.
+    """
+
+    gc.collect()
+    server.reset_stats()
+    start = time.time()
+    func(server, size)
+    wall = time.time() - start
+    requests, bytes_sent = server.requests, server.bytes_sent
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(server, size)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {'wall': round(wall, 4), 'requests': requests,
+            'bytes': bytes_sent, 'peak_memory': peak}
+
+
+def run(sizes=DEFAULT_SIZES, scenarios=None, latency=0.0, page_size=1000,
+        comments=3):
+    """Run the benchmarks.
+
+    :param tuple sizes: The entity counts to benchmark.
+    :param list scenarios: The names of the scenarios to run. Defaults to all.
+    :param float latency: Seconds of latency added to each response.
+    :param int page_size: The server's largest page size.
+    :param int comments: The number of comments on each entity.
+    :returns: A dict mapping scenario names to sizes to measurements.
+    """
+
+    results = {}
+    for size in sizes:
+        server = FakeTpServer(entities=size, comments=comments,
+                              page_size=max(page_size, size),
+                              latency=latency)
+        with server, Environment(server):
+            for name, func in SCENARIOS:
+                if scenarios and name not in scenarios:
+                    continue
+                if name == 'fetch':
+                    server.page_size = page_size
+                else:
+                    server.page_size = max(page_size, size)
+                results.setdefault(name, {})[str(size)] = measure(
+                    server, func, size)
+    return results
+
+
+def load_baselines(filename=BASELINES):
+    """Load the stored baselines or an empty dict."""
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_baselines(results, filename=BASELINES):
+    """Merge *results* into the stored baselines."""
+    baselines = load_baselines(filename)
+    for name, sizes in results.items():
+        baselines.setdefault(name, {}).update(sizes)
+    with open(filename, 'w') as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def format_results(results, baselines=None):
+    """Format *results* as a table, with ratios to *baselines* if given."""
+    baselines = baselines or {}
+    lines = ['{0:<8} {1:>7} {2:>10} {3:>9} {4:>12} {5:>12}  {6}'.format(
+        'scenario', 'size', 'wall (s)', 'requests', 'bytes', 'peak mem',
+        'vs. baseline')]
+    for name, sizes in sorted(results.items()):
+        for size, m in sorted(sizes.items(), key=lambda i: int(i[0])):
+            base = baselines.get(name, {}).get(size)
+            if base:
+                compare = 'wall x{0:.2f}, mem x{1:.2f}'.format(
+                    m['wall'] / (base['wall'] or 1),
+                    m['peak_memory'] / float(base['peak_memory'] or 1))
+            else:
+                compare = '-'
+            lines.append(
+                '{0:<8} {1:>7} {2:>10.3f} {3:>9} {4:>12} {5:>12}  {6}'.format(
+                    name, size, m['wall'], m['requests'], m['bytes'],
+                    m['peak_memory'], compare))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='Comma-separated entity counts.')
+    parser.add_argument('--scenarios', default='',
+                        help='Comma-separated scenarios to run.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds of latency added to each response.')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='The largest page the server returns.')
+    parser.add_argument('--comments', type=int, default=3,
+                        help='The number of comments on each entity.')
+    parser.add_argument('--save', action='store_true',
+                        help='Store the results as the new baselines.')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',') if s]
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    results = run(sizes, scenarios, args.latency, args.page_size,
+                  args.comments)
+    print(format_results(results, load_baselines()))
+    if args.save:
+        save_baselines(results)
+
+
+if __name__ == '__main__':
+    main()
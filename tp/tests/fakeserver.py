@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""A local stand-in for the Targetprocess /api/v1/ endpoints.
+
+The server generates synthetic Assignables, Comments, Users and a Context on
+demand, so large entity counts don't need to be held in memory.
+
+For example:
+
+    > with FakeTpServer(entities=10000, latency=0.01) as server:
+    >     api = TpApi('fake', token='abc', uri=server.uri)
+    >     ...
+    >     print(server.requests, server.bytes_sent)
+
+"""
+
+from datetime import datetime
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlsplit
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qsl, urlsplit
+
+ENTITY_TYPES = ('Bug', 'Task', 'UserStory')
+ENTITY_STATES = ('Open', 'Planned', 'In Progress', 'Testing', 'Done')
+FIRST_NAMES = ('Jill', 'John', 'Mary', 'Paul', 'Rosa', 'Ahmed', 'Lin', 'Sam')
+LAST_NAMES = ('Ross', 'Smith', 'Lamb', 'Jones', 'Park', 'Khan', 'Wu', 'Diaz')
+
+#: Targetprocess caps inline collections, e.g. Comments, at 25 items.
+INLINE_COLLECTION_SIZE = 25
+
+#: 2015-01-01 00:00:00 UTC in milliseconds.
+BASE_DATE = 1420070400000
+
+#: The server's UTC offset in milliseconds, i.e. -0500.
+UTC_OFFSET = -5 * 3600000
+
+
+def tp_date(ms):
+    """Format a timestamp in milliseconds as a Tp date string."""
+    return '/Date({0}-0500)/'.format(ms)
+
+
+def parse_where_date(text):
+    """Parse a date such as '2015-01-01 10:00:00' into milliseconds."""
+    dt = datetime.strptime(text, '%Y-%m-%d %H:%M:%S')
+    delta = dt - datetime(1970, 1, 1)
+    return (delta.days * 86400 + delta.seconds) * 1000 - UTC_OFFSET
+
+
+def parse_include(include):
+    """Parse a Tp include projection into a nested dict.
+
+    For example, '[Id,Owner[FirstName]]' becomes
+    {'Id': {}, 'Owner': {'FirstName': {}}}.
+
+    :param str include: The include projection.
+    :returns: The projection or None if *include* is empty.
+    """
+
+    if not include:
+        return None
+    tree = {}
+    stack = [tree]
+    name = ''
+    for char in include.strip()[1:-1]:
+        if char in ',[]':
+            name = name.strip()
+            if name:
+                stack[-1][name] = {}
+            if char == '[':
+                stack.append(stack[-1][name])
+            elif char == ']':
+                stack.pop()
+            name = ''
+        else:
+            name += char
+    name = name.strip()
+    if name:
+        stack[-1][name] = {}
+    return tree
+
+
+def project(obj, projection):
+    """Reduce *obj* to the fields in *projection*.
+
+    Field names are matched case-insensitively, like Tp does. Nested objects
+    without a sub-projection keep their Id and Name.
+    """
+
+    if projection is None:
+        return obj
+    keys = {key.lower(): key for key in obj}
+    result = {'ResourceType': obj.get('ResourceType')}
+    for field, sub in projection.items():
+        key = keys.get(field.lower())
+        if key is None:
+            continue
+        value = obj[key]
+        if isinstance(value, dict) and 'Items' in value:
+            items = value['Items'][:INLINE_COLLECTION_SIZE]
+            value = {'Items': [project(i, sub or None) for i in items]}
+        elif isinstance(value, dict):
+            value = project(value, sub or {'Id': {}, 'Name': {}})
+        result[key] = value
+    result.setdefault('Id', obj.get('Id'))
+    return result
+
+
+class FakeTpServer(object):
+    """A local HTTP server that imitates the Tp REST API."""
+
+    def __init__(self, entities=1000, comments=3, page_size=1000, latency=0.0,
+                 users=50, projects=10):
+        """Configure the synthetic data.
+
+        :param int entities: The number of Assignables to serve.
+        :param int comments: The number of comments on each Assignable.
+        :param int page_size: The largest number of items in one response.
+        :param float latency: Seconds to wait before answering each request.
+        :param int users: The number of distinct owners.
+        :param int projects: The number of distinct projects.
+        """
+
+        self.entities = entities
+        self.comments = comments
+        self.page_size = page_size
+        self.latency = latency
+        self.users = users
+        self.projects = projects
+        self.requests = 0
+        self.bytes_sent = 0
+        self.changes = {}
+        self.last_modified = BASE_DATE + entities * 60000 + 3600000
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    @property
+    def uri(self):
+        """The base URI template for a TpApi object."""
+        return 'http://127.0.0.1:{0}/api/v1/'.format(
+            self._server.server_address[1])
+
+    def start(self):
+        """Start serving in a background thread."""
+        handler = type('Handler', (_Handler, ), {'tp_server': self})
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def reset_stats(self):
+        """Reset the request and byte counters."""
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def record(self, size):
+        """Count a response of *size* bytes."""
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def touch(self, entity_id, **fields):
+        """Modify the Assignable *entity_id* a second after the last change.
+
+        :param int entity_id: The ID of the Assignable.
+        :param fields: New values, e.g. Name='...' or State='Done'.
+        """
+
+        with self._lock:
+            self.last_modified += 1000
+            changes = self.changes.setdefault(entity_id, {})
+            changes.update(fields, ModifyDate=self.last_modified)
+
+    def get_modify_date(self, entity_id):
+        """Get the ModifyDate of an Assignable in milliseconds."""
+        changes = self.changes.get(entity_id, {})
+        return changes.get('ModifyDate',
+                           BASE_DATE + entity_id * 60000 + 3600000)
+
+    def get_state(self, entity_id):
+        """Get the name of an Assignable's EntityState."""
+        changes = self.changes.get(entity_id, {})
+        return changes.get('State',
+                           ENTITY_STATES[entity_id % len(ENTITY_STATES)])
+
+    def make_user(self, user_id):
+        """Generate the user with ID *user_id*."""
+        return {
+            'ResourceType': 'User',
+            'Id': user_id,
+            'FirstName': FIRST_NAMES[user_id % len(FIRST_NAMES)],
+            'LastName': LAST_NAMES[user_id // len(FIRST_NAMES) %
+                                   len(LAST_NAMES)],
+            'Login': 'user{0}'.format(user_id),
+            'Email': 'user{0}@example.com'.format(user_id),
+        }
+
+    def make_comment(self, general_id, index):
+        """Generate comment *index* of the entity *general_id*."""
+        comment_id = general_id * 1000 + index
+        return {
+            'ResourceType': 'Comment',
+            'Id': comment_id,
+            'Description': '<div>Comment {0} on #{1}.</div>'.format(
+                index, general_id),
+            'CreateDate': tp_date(BASE_DATE + general_id * 60000 +
+                                  index * 1000),
+            'ParentId': None if index % 3 == 0 else comment_id - 1,
+            'General': {'ResourceType': 'General', 'Id': general_id},
+            'Owner': self.make_user(1 + (general_id + index) % self.users),
+        }
+
+    def make_assignable(self, entity_id):
+        """Generate the Assignable with ID *entity_id*."""
+        entity_type = ENTITY_TYPES[entity_id % len(ENTITY_TYPES)]
+        state = ENTITY_STATES.index(self.get_state(entity_id))
+        project_id = 1 + entity_id % self.projects
+        created = BASE_DATE + entity_id * 60000
+        name = self.changes.get(entity_id, {}).get(
+            'Name', 'Synthetic {0} number {1}'.format(entity_type.lower(),
+                                                      entity_id))
+        return {
+            'ResourceType': entity_type,
+            'Id': entity_id,
+            'Name': name,
+            'Description': ('<div>This is <b>{0}</b> #{1}.</div><div></div>'
+                            '<div>It has a <i>formatted</i> description.'
+                            '</div>'.format(entity_type, entity_id)),
+            'CreateDate': tp_date(created),
+            'ModifyDate': tp_date(self.get_modify_date(entity_id)),
+            'LastStateChangeDate': tp_date(created + 1800000),
+            'EntityType': {'ResourceType': 'EntityType',
+                           'Id': 4 + ENTITY_TYPES.index(entity_type),
+                           'Name': entity_type},
+            'EntityState': {'ResourceType': 'EntityState', 'Id': 10 + state,
+                            'Name': ENTITY_STATES[state]},
+            'Project': {'ResourceType': 'Project', 'Id': project_id,
+                        'Name': 'Project {0}'.format(project_id)},
+            'Owner': self.make_user(1 + entity_id % self.users),
+            'Comments': {'Items': [self.make_comment(entity_id, i) for i in
+                                   range(self.comments)]},
+        }
+
+    def get_ids(self, where, count):
+        """Get the IDs matching *where* out of *count* IDs."""
+        where = where or ''
+        m = re.search(r'\bId eq (\d+)', where)
+        if m is not None:
+            entity_id = int(m.group(1))
+            ids = [entity_id] if 0 < entity_id <= count else []
+        else:
+            m = re.search(r'\bId in \(([\d,\s]+)\)', where)
+            if m is not None:
+                ids = [int(i) for i in m.group(1).split(',')]
+                ids = [i for i in ids if 0 < i <= count]
+            else:
+                ids = range(1, count + 1)
+
+        m = re.search(r'\bId gt (\d+)', where)
+        if m is not None:
+            ids = [i for i in ids if i > int(m.group(1))]
+        m = re.search(r"\bModifyDate gte '([^']+)'", where, re.I)
+        if m is not None:
+            since = parse_where_date(m.group(1))
+            ids = [i for i in ids if self.get_modify_date(i) >= since]
+        m = re.search(r"\bEntityState\.Name eq '([^']+)'", where, re.I)
+        if m is not None:
+            state = m.group(1).lower()
+            ids = [i for i in ids if self.get_state(i).lower() == state]
+        return ids
+
+    def get_collection(self, resource, params):
+        """Get a page of items for a collection resource."""
+        where = params.get('where')
+        if resource == 'Comments':
+            m = re.search(r'General\.Id eq (\d+)', where or '')
+            general_id = int(m.group(1)) if m else 1
+            items = [self.make_comment(general_id, i) for i in
+                     range(self.comments)]
+            make = None
+        elif resource == 'Users':
+            ids = self.get_ids(where, self.users)
+            make = self.make_user
+        else:
+            ids = self.get_ids(where, self.entities)
+            make = self.make_assignable
+
+        if make is not None:
+            ids = list(ids)
+            if 'orderByDesc' in params:
+                ids.reverse()
+            items = ids
+
+        skip = int(params.get('skip') or 0)
+        take = min(int(params.get('take') or 25), self.page_size)
+        page = items[skip:skip + take]
+        if make is not None:
+            page = [make(i) for i in page]
+
+        projection = parse_include(params.get('include'))
+        content = {'Items': [project(item, projection) for item in page]}
+        if skip + take < len(items):
+            content['Next'] = '{0}?skip={1}&take={2}'.format(
+                resource, skip + take, take)
+        return content
+
+    def get_content(self, path, params):
+        """Get the response content for a GET request."""
+        resource = path.split('/api/v1/', 1)[-1].strip('/')
+        if resource == 'Context':
+            return {'LoggedUser': self.make_user(1), 'Acid': 'FAKE'}
+        if resource == 'Authentication':
+            return {'Token': 'fake-token'}
+        parts = resource.split('/')
+        if len(parts) == 2 and parts[1].isdigit():
+            if parts[0] == 'Users':
+                return self.make_user(int(parts[1]))
+            return self.make_assignable(int(parts[1]))
+        return self.get_collection(parts[0], params)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    #: The FakeTpServer object serving requests.
+    tp_server = None
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _read_params(self):
+        """Read the query string and any JSON body into one dict."""
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+            if isinstance(body, dict):
+                params.update(body)
+        return url.path, params
+
+    def _send(self, status, content):
+        body = json.dumps(content).encode('utf-8')
+        if self.tp_server.latency:
+            time.sleep(self.tp_server.latency)
+        self.tp_server.record(len(body))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path, params = self._read_params()
+        self._send(200, self.tp_server.get_content(path, params))
+
+    def do_POST(self):
+        path, params = self._read_params()
+        params.setdefault('Id', 1)
+        self._send(200, params)
+
+    def do_DELETE(self):
+        self._read_params()
+        self._send(200, {})
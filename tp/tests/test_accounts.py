@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for listing entities from several accounts."""
+
+import time
+import unittest
+
+from click.testing import CliRunner
+
+from tp.app import TpApp
+from tp.cli import main
+from tp.tests.benchmarks import Environment
+from tp.tests.fakeserver import FakeTpServer
+
+ACCOUNT_CONFIG = """
+[auth.eu]
+subdomain = fake-eu
+token = fake-token
+username = fake
+uri = {uri}
+"""
+
+
+class TestAccounts(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=4, latency=0.3)
+        self.server.start()
+        self.eu_server = FakeTpServer(entities=6, latency=0.3)
+        self.eu_server.start()
+        self.env = Environment(self.server, ACCOUNT_CONFIG.format(
+            uri=self.eu_server.uri))
+        self.env.__enter__()
+
+    def test_list_accounts(self):
+        app = TpApp('ls')
+        start = time.time()
+        results = app.list_accounts(['default', 'eu'], [], number=5,
+                                    offset=1)
+        # The accounts are queried at the same time.
+        self.assertLess(time.time() - start, 0.55)
+        self.assertEqual([(e['Account'], e['Id']) for e in results],
+                         [('eu', 5), ('default', 4), ('eu', 4),
+                          ('default', 3), ('eu', 3)])
+
+    def test_ls(self):
+        result = CliRunner().invoke(main, ['ls', '2', '-a', 'eu,default'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        lines = result.output.strip().splitlines()
+        self.assertTrue(lines[0].startswith('Account'))
+        self.assertTrue(lines[2].startswith('eu'))
+
+        result = CliRunner().invoke(main, ['ls', '-a', 'us'])
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn('[auth.us]', result.output)
+
+    def tearDown(self):
+        self.env.__exit__(None, None, None)
+        self.server.stop()
+        self.eu_server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
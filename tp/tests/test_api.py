@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit tests for the `tp.api` module."""
+
+import json
+import unittest
+
+from tp import api
+from tp.formatter import Formatter
+
+
+class TestCompactEntity(unittest.TestCase):
+
+    def setUp(self):
+        self.items = [
+            {'Id': 1, 'Name': 'One', 'Owner': {'Id': 5, 'FirstName': 'Jill',
+                                               'LastName': 'Ross'},
+             'Comments': {'Items': [{'Id': 10}]}},
+            {'Id': 2, 'Name': 'Two', 'Owner': {'Id': 6, 'FirstName': 'John',
+                                               'LastName': 'Smith'},
+             'Comments': {'Items': []}},
+        ]
+        schemas = {}
+        self.entities = [api.CompactEntity.from_dict(item, schemas)
+                         for item in self.items]
+
+    def test_lookup(self):
+        entity = self.entities[0]
+        self.assertEqual(entity['Owner']['FirstName'], 'Jill')
+        self.assertEqual(entity['Comments']['Items'][0]['Id'], 10)
+        self.assertRaises(KeyError, entity.__getitem__, 'Missing')
+        self.assertEqual(entity.to_dict(), self.items[0])
+
+    def test_shared_schema(self):
+        first, second = self.entities
+        self.assertIs(first._schema, second._schema)
+        self.assertIs(first['Owner']._schema, second['Owner']._schema)
+
+    def test_formatter(self):
+        fentity = Formatter(self.entities[1])
+        self.assertEqual(fentity.get('Owner.Name'), 'John Smith')
+        self.assertEqual('{Owner[LastName]}'.format(**fentity), 'Smith')
+
+    def test_to_entity(self):
+        entity = self.entities[0].to_entity(api.Assignable)
+        self.assertIsInstance(entity, api.Assignable)
+        self.assertEqual(entity, self.items[0])
+        entity['Owner']['FirstName'] = 'Mary'
+        self.assertEqual(self.entities[0]['Owner']['FirstName'], 'Jill')
+
+
+class TestInterner(unittest.TestCase):
+
+    def setUp(self):
+        owner = '{"ResourceType": "User", "Id": 5, "FirstName": "Jill"}'
+        text = ('{{"Items": [{{"ResourceType": "Bug", "Id": 1, "Owner": {0}}},'
+                '{{"ResourceType": "Bug", "Id": 2, "Owner": {0}}}]}}'
+                .format(owner))
+        self.items = json.loads(text, object_hook=api.Interner().hook)['Items']
+
+    def test_shared(self):
+        first, second = self.items
+        self.assertIs(first['Owner'], second['Owner'])
+        self.assertIsInstance(first['Owner'], api.ReferenceObject)
+        self.assertRaises(TypeError, first['Owner'].__setitem__, 'Id', 6)
+
+    def test_formatter_cache(self):
+        first = Formatter(self.items[0])['Owner']
+        second = Formatter(self.items[1])['Owner']
+        self.assertIs(first, second)
+        self.assertEqual(first['FirstName'], 'Jill')
+
+    def test_compact(self):
+        schemas = {}
+        first, second = [api.CompactEntity.from_dict(item, schemas)
+                         for item in self.items]
+        self.assertIs(first['Owner'], second['Owner'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Smoke tests for the benchmark suite and fake Tp server."""
+
+import unittest
+
+from tp import api
+from tp.tests import benchmarks
+from tp.tests.fakeserver import FakeTpServer
+
+
+class TestFakeServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=30, page_size=10)
+        self.server.start()
+        self.api = api.TpApi('fake', token='abc', uri=self.server.uri,
+                             throttle=api.Throttle(rate_limit=0))
+
+    def test_fetch_pages(self):
+        items = api.fetch(self.api, api.Assignable, take=25, skip=5,
+                          include=['Id', 'Owner[FirstName]'])
+        self.assertEqual([i['Id'] for i in items], list(range(6, 16)))
+        self.assertEqual(set(items[0]['Owner']),
+                         set(['ResourceType', 'Id', 'FirstName']))
+        self.assertEqual(self.server.requests, 1)
+
+    def test_fetch_by_id(self):
+        items = api.fetch(self.api, api.Assignable, where='Id eq 7')
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['Id'], 7)
+
+    def tearDown(self):
+        self.server.stop()
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run(self):
+        results = benchmarks.run(sizes=(20, ), page_size=10)
+        self.assertEqual(set(results), set(['ls', 'show', 'fetch']))
+        self.assertEqual(results['ls']['20']['requests'], 1)
+        self.assertEqual(results['fetch']['20']['requests'], 2)
+        self.assertTrue(results['ls']['20']['peak_memory'] > 0)
+        self.assertIn('vs. baseline', benchmarks.format_results(results))
+
+
+if __name__ == '__main__':
+    unittest.main()
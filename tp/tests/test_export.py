@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for exporting entities."""
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tp.app import TpApp
+from tp.export import Exporter, ExportError
+from tp.tests.benchmarks import Environment
+from tp.tests.fakeserver import FakeTpServer
+
+
+class TestExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=20)
+        self.server.start()
+        self.env = Environment(self.server)
+        self.env.__enter__()
+        self.app = TpApp('export')
+        self.tmp_dir = tempfile.mkdtemp(prefix='tp-test-')
+        self.output = os.path.join(self.tmp_dir, 'out.ndjson.gz')
+
+    def read_ids(self):
+        with gzip.open(self.output, 'rt') as f:
+            return [json.loads(line)['Id'] for line in f]
+
+    def test_export_csv(self):
+        output = os.path.join(self.tmp_dir, 'out.csv')
+        count = Exporter(self.app, ['state=open'], output, fmt='csv',
+                         page_size=3).run()
+        self.assertEqual(count, 4)
+        with open(output) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'Id,Type,State,Name,Owner,Project,'
+                                   'Created,Modified')
+        self.assertEqual(lines[1].split(',')[:3], ['5', 'UserStory', 'Open'])
+        self.assertEqual(len(lines), 5)
+        self.assertFalse(os.path.exists(output + '.checkpoint'))
+
+    def test_resume(self):
+        exporter = Exporter(self.app, [], self.output, compress=True,
+                            page_size=6)
+        write = exporter._write
+        pages = []
+
+        def fail_third_page(f, chunk):
+            pages.append(chunk)
+            if len(pages) == 3:
+                # Write part of the page before failing.
+                f.write(b'partial')
+                raise IOError('Interrupted')
+            write(f, chunk)
+
+        exporter._write = fail_third_page
+        self.assertRaises(IOError, exporter.run)
+        with open(self.output + '.checkpoint') as f:
+            size = json.load(f)['size']
+        with open(self.output, 'rb') as f:
+            data = f.read(size)
+        lines = gzip.GzipFile(fileobj=io.BytesIO(data)).read().splitlines()
+        self.assertEqual([json.loads(line)['Id'] for line in lines],
+                         list(range(1, 13)))
+
+        self.server.reset_stats()
+        exporter = Exporter(self.app, [], self.output, compress=True,
+                            page_size=6)
+        self.assertEqual(exporter.run(), 20)
+        self.assertEqual(exporter.resumed_count, 12)
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.read_ids(), list(range(1, 21)))
+
+        # A checkpoint for other filters isn't used.
+        exporter = Exporter(self.app, ['bug'], self.output, compress=True,
+                            page_size=6)
+        exporter.checkpoint.save(key='other', last_id=6, count=6, size=0)
+        self.assertRaises(ExportError, exporter.run)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+        self.env.__exit__(None, None, None)
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for prefetching `tp show` responses."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests
+from click.testing import CliRunner
+
+from tp import cache
+from tp.cli import main
+from tp.tests.benchmarks import Environment
+from tp.tests.fakeserver import FakeTpServer
+
+
+class TestDiskResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp(prefix='tp-test-')
+        self.cache = cache.DiskResponseCache(
+            os.path.join(self.tmp_dir, 'cache'), ttl=60)
+        self.response = requests.Response()
+        self.response.status_code = 200
+        self.response.url = 'http://tp/api/v1/Bugs?token=secret'
+        self.response._content = b'{"Items": []}'
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', self.response)
+        response = self.cache.get('key')
+        self.assertEqual(response.json(), {'Items': []})
+        self.assertNotIn('secret', response.url)
+        self.assertEqual(len(self.cache), 1)
+
+        self.cache.ttl = 0
+        time.sleep(0.01)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(len(self.cache), 0)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'Prefetching needs os.fork().')
+class TestPrefetch(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=10)
+        self.server.start()
+        self.env = Environment(self.server)
+        self.env.__enter__()
+        self.cache_dir = os.path.join(self.env.tmp_dir, 'cache')
+
+    def wait_for_cache(self, count):
+        disk_cache = cache.DiskResponseCache(self.cache_dir)
+        for _ in range(100):
+            if len(disk_cache) >= count:
+                return
+            time.sleep(0.05)
+        self.fail('The responses were not prefetched.')
+
+    def test_ls_then_show(self):
+        runner = CliRunner()
+        result = runner.invoke(main, ['ls', '--prefetch', '2'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.wait_for_cache(2)
+        self.assertEqual(self.server.requests, 3)
+
+        result = runner.invoke(main, ['show', '9'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Synthetic bug number 9', result.output)
+        self.assertEqual(self.server.requests, 3)
+
+        # Only the top rows are prefetched.
+        result = runner.invoke(main, ['show', '8'])
+        self.assertEqual(self.server.requests, 4)
+
+    def tearDown(self):
+        self.env.__exit__(None, None, None)
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
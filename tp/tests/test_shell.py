@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the interactive tp shell."""
+
+import unittest
+
+from click.testing import CliRunner
+
+from tp.app import TpApp
+from tp.cli import main
+from tp.tests.benchmarks import Environment
+from tp.tests.fakeserver import FakeTpServer
+
+
+class TestShell(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=5)
+        self.server.start()
+        self.env = Environment(self.server)
+        self.env.__enter__()
+
+    def run_shell(self, lines):
+        result = CliRunner().invoke(main, ['shell'], input='\n'.join(lines))
+        self.assertIsNone(result.exception)
+        return result.output
+
+    def test_reuses_results(self):
+        output = self.run_shell(['ls', 'sort Id', 'show 2', 'exit'])
+        self.assertIn('Synthetic userstory number 2\n', output)
+        # Sorting and showing by row number don't list again.
+        self.assertEqual(self.server.requests, 2)
+
+    def test_errors(self):
+        output = self.run_shell(['bogus', 'ls --nope', 'show "2'])
+        self.assertIn("Unknown command 'bogus'.", output)
+        self.assertIn("No such option '--nope'", output)
+        self.assertIn('No closing quotation', output)
+
+    def tearDown(self):
+        self.env.__exit__(None, None, None)
+        self.server.stop()
+        TpApp.reuse = False
+        TpApp._shared.clear()
+
+
+if __name__ == '__main__':
+    unittest.main()
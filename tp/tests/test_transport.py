@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Unit tests for the `tp.transport` module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from tp import api, transport
+from tp.tests.fakeserver import FakeTpServer
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cassette = os.path.join(self.tmp_dir, 'cassette.jsonl')
+
+    def test_round_trip(self):
+        with FakeTpServer(entities=20) as server:
+            recorder = transport.RecordingTransport(self.cassette)
+            tp_api = api.TpApi('fake', token='secret', uri=server.uri,
+                               transport=recorder)
+            recorded = api.fetch(tp_api, api.Assignable, take=5,
+                                 include=['Id', 'Name'])
+
+        with open(self.cassette) as f:
+            self.assertNotIn('secret', f.read())
+
+        player = transport.ReplayTransport(self.cassette)
+        tp_api = api.TpApi('fake', token='secret', transport=player)
+        replayed = api.fetch(tp_api, api.Assignable, take=5,
+                             include=['Id', 'Name'])
+        self.assertEqual(recorded, replayed)
+
+        self.assertRaises(transport.CassetteError, api.fetch, tp_api,
+                          api.Assignable, take=6)
+
+    def test_mask_token(self):
+        self.assertEqual(transport.mask_token('a?token=ab%3D12&format=json'),
+                         'a?token=*****&format=json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for keeping listings up to date."""
+
+import unittest
+
+from tp.app import TpApp
+from tp.tests.benchmarks import Environment
+from tp.tests.fakeserver import FakeTpServer
+from tp.watch import ListWatcher
+
+
+class TestListWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeTpServer(entities=50)
+        self.server.start()
+        self.env = Environment(self.server)
+        self.env.__enter__()
+        self.watcher = ListWatcher(TpApp('ls'), ['state=open'])
+        self.watcher.load()
+        self.server.reset_stats()
+
+    def ids(self):
+        return [e['Id'] for e in self.watcher.results]
+
+    def test_load(self):
+        self.assertEqual(self.ids(), list(range(50, 0, -5)))
+        self.assertEqual(self.watcher.since, '2014-12-31 20:50:00')
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.poll(), set())
+        # The entity modified last is asked for again but doesn't count.
+        self.assertEqual(self.server.requests, 2)
+
+    def test_changes(self):
+        self.server.touch(7, State='Open')
+        self.server.touch(10, Name='Renamed')
+        self.server.touch(15, State='Done')
+        self.server.touch(16)
+        self.assertEqual(self.watcher.poll(), set([7, 10, 15]))
+        self.assertEqual(self.server.requests, 2)
+        self.assertEqual(self.ids(), [50, 45, 40, 35, 30, 25, 20, 10, 7, 5])
+        self.assertEqual(self.watcher.results[7]['Name'], 'Renamed')
+        self.assertEqual(self.watcher.since, '2014-12-31 20:50:02')
+        self.assertEqual(self.watcher.poll(), set())
+
+    def tearDown(self):
+        self.env.__exit__(None, None, None)
+        self.server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
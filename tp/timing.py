@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""Lightweight timing spans for tp.
+
+Spans are only recorded after :func:`enable` is called. While disabled,
+:func:`span` returns a shared, falsy no-op span, so instrumented code costs
+little more than a function call.
+
+For example:
+
+    > with timing.span('api.request', resource='Context') as s:
+    >     response = send()
+    >     if s:
+    >         s.set(bytes=len(response.content))
+
+Classes:
+    * Span: A timed section of code.
+
+Functions:
+    * enable: Start recording spans.
+    * disable: Stop recording spans and discard recorded spans.
+    * is_enabled: Whether or not spans are being recorded.
+    * span: Create a span.
+    * timed: Decorate a function so each call is recorded as a span.
+    * get_spans: Get the recorded spans.
+    * format_report: Format the recorded spans as a breakdown table.
+    * write_spans: Append the recorded spans to a file as JSON lines.
+
+"""
+
+from collections import OrderedDict
+import functools
+import json
+import threading
+import time
+
+_clock = getattr(time, 'perf_counter', time.time)
+
+_enabled = False
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+
+class Span(object):
+    """A timed section of code."""
+
+    __slots__ = ('name', 'attrs', 'start', 'duration', 'depth', 'parent')
+
+    def __init__(self, name, attrs):
+        """Store the span's name and attributes.
+
+        :param str name: The span's name, e.g. 'api.request'.
+        :param dict attrs: Extra attributes to record, e.g. bytes or items.
+        """
+
+        self.name = name
+        self.attrs = attrs
+        self.start = None
+        self.duration = None
+        self.depth = 0
+        self.parent = None
+
+    def __bool__(self):
+        return True
+
+    __nonzero__ = __bool__
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        self.depth = len(stack)
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = _clock()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = _clock() - self.start
+        _local.stack.pop()
+        with _lock:
+            _spans.append(self)
+        return False
+
+    def set(self, **attrs):
+        """Record extra attributes, e.g. bytes received or item counts."""
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        """Get the span as a JSON-serializable dict."""
+        d = OrderedDict((('name', self.name), ('parent', self.parent),
+                         ('depth', self.depth), ('start', self.start),
+                         ('duration', self.duration)))
+        d.update(self.attrs)
+        return d
+
+
+class _NullSpan(object):
+    """A span that records nothing."""
+
+    __slots__ = ()
+
+    def __bool__(self):
+        return False
+
+    __nonzero__ = __bool__
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_null_span = _NullSpan()
+
+
+def enable():
+    """Start recording spans."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording spans and discard any recorded spans."""
+    global _enabled
+    _enabled = False
+    with _lock:
+        del _spans[:]
+
+
+def is_enabled():
+    """Whether or not spans are being recorded."""
+    return _enabled
+
+
+def span(name, **attrs):
+    """Create a span to be used as a context manager.
+
+    :param str name: The span's name, e.g. 'api.request'.
+    :param attrs: Extra attributes to record with the span.
+    :returns: A :class:`Span` or a no-op span if timing is disabled.
+    """
+
+    if _enabled is False:
+        return _null_span
+    return Span(name, attrs)
+
+
+def timed(name):
+    """Decorate a function so that each call is recorded as a span.
+
+    If the function returns a list or tuple, its length is recorded as the
+    span's item count.
+
+    :param str name: The span's name.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _enabled is False:
+                return func(*args, **kwargs)
+            with Span(name, {}) as s:
+                result = func(*args, **kwargs)
+                if isinstance(result, (list, tuple)):
+                    s.set(items=len(result))
+                return result
+        return wrapper
+    return decorator
+
+
+def get_spans():
+    """Get the recorded spans in the order they were started."""
+    with _lock:
+        return sorted(_spans, key=lambda s: s.start)
+
+
+def format_report():
+    """Format the recorded spans as a breakdown table.
+
+    Spans with the same name and depth are combined into one row.
+
+    :rtype: str
+    """
+
+    rows = OrderedDict()
+    for s in get_spans():
+        row = rows.setdefault((s.depth, s.name),
+                              {'count': 0, 'duration': 0.0, 'bytes': 0,
+                               'items': 0})
+        row['count'] += 1
+        row['duration'] += s.duration
+        row['bytes'] += s.attrs.get('bytes', 0) or 0
+        row['items'] += s.attrs.get('items', 0) or 0
+
+    lines = ['{0:<36} {1:>6} {2:>10} {3:>10} {4:>8}'.format(
+        'span', 'count', 'ms', 'bytes', 'items')]
+    for (depth, name), row in rows.items():
+        lines.append('{0:<36} {1:>6} {2:>10.1f} {3:>10} {4:>8}'.format(
+            '  ' * depth + name, row['count'], row['duration'] * 1000,
+            row['bytes'] or '', row['items'] or ''))
+    return '\n'.join(lines)
+
+
+def write_spans(filename, **extra):
+    """Append the recorded spans to *filename* as JSON lines.
+
+    :param str filename: The file to append to.
+    :param extra: Extra fields added to every line, e.g. a run ID.
+    """
+
+    with open(filename, 'a') as f:
+        for s in get_spans():
+            d = s.to_dict()
+            d.update(extra)
+            f.write(json.dumps(d, default=str) + '\n')
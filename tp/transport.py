@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Transports used by TpApi to send HTTP requests.
+
+A transport has a single method, send(method, url, **kwargs), that takes the
+same arguments as requests.request() and returns a requests.Response.
+
+For example, to record traffic once and replay it later without a network:
+
+    > api = TpApi(subdomain, token=token,
+    >             transport=RecordingTransport('slow-query.jsonl'))
+    > ...
+    > api = TpApi(subdomain, token=token,
+    >             transport=ReplayTransport('slow-query.jsonl'))
+
+Classes:
+    * HttpTransport: Sends requests over the network.
+    * RecordingTransport: Records request/response pairs to a cassette file.
+    * ReplayTransport: Serves responses from a cassette file.
+    * CassetteError: Raised when a cassette has no matching response.
+
+Functions:
+    * mask_token: Hide security tokens in a string.
+    * get_request_key: Get a key identifying a request.
+    * dump_response: Get a JSON-serializable copy of a response.
+    * load_response: Rebuild a response from dump_response()'s output.
+
+"""
+
+from collections import deque
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+_clock = getattr(time, 'monotonic', time.time)
+
+#: The replacement for hidden tokens.
+MASK = '*****'
+
+
+def mask_token(text):
+    """Hide any security tokens in *text*, e.g. in a URL or error message."""
+    return re.sub('(?<=token=)[^&\\s\'"]+', MASK, text)
+
+
+def get_request_key(method, url, params=None, json_data=None, strict=True):
+    """Get a key identifying a request.
+
+    :param str method: The HTTP method.
+    :param str url: The request URL.
+    :param dict params: The query string parameters.
+    :param json_data: The JSON body.
+    :param bool strict: Whether or not requests to different hosts or with
+        different tokens get different keys. The token itself is never part
+        of the key.
+    :returns: A JSON-encoded key.
+    :rtype: str
+    """
+
+    params = dict(params or {})
+    if 'token' in params:
+        params['token'] = (hashlib.sha1(params['token'].encode('utf-8'))
+                           .hexdigest() if strict is True else MASK)
+    parts = urlsplit(url)
+    location = parts.netloc + parts.path if strict is True else parts.path
+    return json.dumps([method.lower(), location, params, json_data],
+                      sort_keys=True, default=str)
+
+
+def dump_response(response, url=None):
+    """Get a JSON-serializable copy of *response*, with tokens hidden.
+
+    :param requests.Response response: The response to copy.
+    :param str url: The request URL, used if the response has none.
+    :rtype: dict
+    """
+
+    return {
+        'status': response.status_code,
+        'url': mask_token(response.url or url or ''),
+        'headers': dict(response.headers),
+        'body': response.content.decode('utf-8', 'replace'),
+    }
+
+
+def load_response(recorded):
+    """Rebuild a requests.Response from the output of dump_response()."""
+    response = requests.Response()
+    response.status_code = recorded['status']
+    response.url = recorded['url']
+    response.headers = CaseInsensitiveDict(recorded['headers'])
+    response.encoding = 'utf-8'
+    response._content = recorded['body'].encode('utf-8')
+    return response
+
+
+class CassetteError(LookupError):
+    """Raised when a cassette has no response for a request."""
+
+
+class HttpTransport(object):
+    """Sends requests over the network using a shared session."""
+
+    def __init__(self, session=None):
+        """Store the session.
+
+        :param requests.Session session: The session to use. A session keeps
+            connections open between requests.
+        """
+
+        self.session = session or requests.Session()
+
+    def send(self, method, url, **kwargs):
+        """Send a request and return the response."""
+        return self.session.request(method, url, **kwargs)
+
+
+class RecordingTransport(object):
+    """Sends requests with another transport and records them.
+
+    Each request/response pair is appended to the cassette file as a line of
+    JSON. Tokens are scrubbed and credentials are never written.
+    """
+
+    def __init__(self, filename, transport=None):
+        """Store the cassette file name and the transport to record.
+
+        :param str filename: The cassette file to append to.
+        :param transport: The transport used to send requests. Defaults to an
+            HttpTransport.
+        """
+
+        self.filename = filename
+        self.transport = transport or HttpTransport()
+        self._lock = threading.Lock()
+
+    def send(self, method, url, **kwargs):
+        """Send a request, record it, and return the response."""
+        start = _clock()
+        response = self.transport.send(method, url, **kwargs)
+        elapsed = _clock() - start
+
+        interaction = {
+            'key': get_request_key(method, url, kwargs.get('params'),
+                                   kwargs.get('json'), strict=False),
+            'elapsed': elapsed,
+            'response': dump_response(response, url),
+        }
+        line = json.dumps(interaction, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self.filename, 'a') as f:
+                f.write(line)
+        return response
+
+
+class ReplayTransport(object):
+    """Serves responses from a cassette without using the network.
+
+    Repeated requests are answered in the order they were recorded. Once a
+    request's recorded responses are used up, the last one is repeated.
+    """
+
+    def __init__(self, filename, latency=False):
+        """Load the cassette.
+
+        :param str filename: The cassette file to read.
+        :param bool latency: Whether or not to wait as long as the recorded
+            request took before responding.
+        """
+
+        self.filename = filename
+        self.latency = latency
+        self._interactions = {}
+        self._lock = threading.Lock()
+
+        with io.open(filename, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                interaction = json.loads(line)
+                self._interactions.setdefault(interaction['key'],
+                                              deque()).append(interaction)
+
+    def send(self, method, url, **kwargs):
+        """Find the recorded response for a request and return it.
+
+        :raises CassetteError: if the cassette has no matching request.
+        """
+
+        key = get_request_key(method, url, kwargs.get('params'),
+                              kwargs.get('json'), strict=False)
+        with self._lock:
+            interactions = self._interactions.get(key)
+            if not interactions:
+                raise CassetteError('No recorded response for {0} {1} in '
+                                    "'{2}'.".format(method.upper(),
+                                                    mask_token(url),
+                                                    self.filename))
+            if len(interactions) > 1:
+                interaction = interactions.popleft()
+            else:
+                interaction = interactions[0]
+
+        if self.latency is True:
+            time.sleep(interaction['elapsed'])
+
+        return load_response(interaction['response'])
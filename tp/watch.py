@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Keep a listing of Tp entities up to date by polling for changes.
+
+After the first load, each poll only asks for the entities modified since the
+newest ModifyDate seen so far, so its cost is proportional to the number of
+changes rather than to the size of the listing.
+
+Classes:
+    * ListWatcher: A listing that can be updated with the latest changes.
+
+"""
+
+from tp.formatter import Formatter, get_timestamp, sort_key
+
+#: The date format used in where conditions.
+WHERE_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class ListWatcher(object):
+    """A listing of entities that merges in the changes since the last poll.
+
+    For example:
+
+        > watcher = ListWatcher(app, ['bug', 'state=open'])
+        > watcher.load()
+        > ...
+        > changed = watcher.poll()
+
+    Entities that change so they no longer match the filters are removed.
+    Deleted entities aren't detected, because they have no ModifyDate.
+    """
+
+    def __init__(self, app, filters, **options):
+        """Store the listing's filters and options.
+
+        :param TpApp app: The app used to list entities.
+        :param list filters: The filters to list entities with.
+        :param options: Any other TpApp.list() options.
+        """
+
+        self.app = app
+        self.filters = filters
+        self.options = options
+        self.results = []
+        self.since = None
+        self._newest = None
+
+    def _fetch(self, **options):
+        options = dict(self.options, **options)
+        options['include'] = list(options.get('include') or ()) + [
+            'ModifyDate']
+        return self.app.list(self.filters, compact=True, intern=True,
+                             **options)
+
+    def _update_since(self, entities):
+        """Move the poll date up to the newest ModifyDate in *entities*."""
+        for entity in entities:
+            timestamp = get_timestamp(entity.get('ModifyDate'))
+            if timestamp is not None and (self._newest is None or
+                                          timestamp > self._newest):
+                self._newest = timestamp
+                self.since = Formatter(entity).get(
+                    'ModifyDate', fmt_option=WHERE_DATE_FORMAT)
+
+    def load(self):
+        """Get the full listing.
+
+        :returns: The matching entities.
+        :rtype: list
+        """
+
+        self.results = list(self._fetch())
+        self._update_since(self.results)
+        return self.results
+
+    def poll(self):
+        """Merge the changes since the last poll into the listing.
+
+        Dates only have a precision of a second, so the entities modified at
+        the newest date are asked for again; they only count as changed if
+        their values differ.
+
+        :returns: The IDs of the entities that were added, changed or
+            removed.
+        :rtype: set
+        """
+
+        if self.since is None:
+            return set(e['Id'] for e in self.load())
+
+        since = self.since
+        updates = self._fetch(since=since, offset=0)
+        current = dict((e['Id'], e) for e in self.results)
+        changed = set(e['Id'] for e in updates
+                      if current.get(e['Id']) != e)
+
+        # Find the entities that changed so they don't match anymore.
+        unseen = set(current) - set(e['Id'] for e in updates)
+        removed = self.app.get_changed_ids(unseen, since) if unseen else ()
+
+        if not changed and not removed:
+            return set()
+
+        for entity_id in removed:
+            del current[entity_id]
+        for entity in updates:
+            current[entity['Id']] = entity
+
+        options = self.app.list_options
+        results = list(current.values())
+        if options.get('sort'):
+            results.sort(key=sort_key(options['sort']),
+                         reverse=bool(options['reverse']))
+        number = options.get('number')
+        if number:
+            results = results[:number]
+
+        self.results = results
+        self._update_since(updates)
+        return changed | set(removed)